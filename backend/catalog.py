@@ -0,0 +1,134 @@
+"""Process-local snapshot of the product catalog.
+
+The catalog is small and rarely changes, so product reads are answered from
+memory instead of querying the products table on every request. The snapshot
+is kept current three ways:
+
+* the create/update/delete handlers in routes/products.py apply their own
+  writes immediately (``upsert`` / ``remove``);
+* a background task started in ``lifespan`` polls for rows whose
+  ``updated_at`` is newer than anything seen so far, picking up writes made by
+  other workers;
+* a periodic full reload drops rows deleted by other workers, which polling on
+  ``updated_at`` cannot see.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+CATALOG_REFRESH_INTERVAL = float(os.getenv("CATALOG_REFRESH_INTERVAL", "30"))
+CATALOG_FULL_RELOAD_INTERVAL = float(os.getenv("CATALOG_FULL_RELOAD_INTERVAL", "600"))
+
+
+class ProductCatalog:
+    def __init__(self, refresh_interval: float = CATALOG_REFRESH_INTERVAL, full_reload_interval: float = CATALOG_FULL_RELOAD_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self._products: Dict[str, dict] = {}
+        # Read views, rebuilt on every change so reads never sort or filter
+        self._all: List[dict] = []
+        self._by_category: Dict[str, List[dict]] = {}
+        self._watermark: Optional[str] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def _rebuild(self):
+        products = sorted(self._products.values(), key=lambda p: (p.get("created_at") or "", p["id"]))
+        by_category: Dict[str, List[dict]] = {}
+        for product in products:
+            by_category.setdefault(product["category"], []).append(product)
+        self._all = products
+        self._by_category = by_category
+
+    def _advance_watermark(self, product: dict):
+        updated_at = product.get("updated_at")
+        if updated_at and (self._watermark is None or updated_at > self._watermark):
+            self._watermark = updated_at
+
+    async def load(self, db: Database):
+        """Replace the snapshot with a full read of the products table"""
+        async with self._lock:
+            response = await db.execute(db.table("products").select("*"))
+            self._products = {product["id"]: product for product in response.data}
+            self._watermark = None
+            for product in response.data:
+                self._advance_watermark(product)
+            self._rebuild()
+            self._loaded_at = time.monotonic()
+        logger.info(f"Product catalog loaded: {len(self._products)} products")
+
+    async def refresh(self, db: Database):
+        """Apply rows changed since the last seen updated_at"""
+        if not self.loaded or self._watermark is None:
+            await self.load(db)
+            return
+
+        async with self._lock:
+            response = await db.execute(db.table("products").select("*").gt("updated_at", self._watermark))
+            if not response.data:
+                return
+            for product in response.data:
+                self._products[product["id"]] = product
+                self._advance_watermark(product)
+            self._rebuild()
+
+    async def ensure_loaded(self, db: Database):
+        if not self.loaded:
+            await self.load(db)
+
+    def upsert(self, product: dict):
+        """Apply a product row written by this process"""
+        # The watermark is left alone: other workers' writes committed just
+        # before this one may carry older timestamps and still need polling
+        self._products[product["id"]] = product
+        self._rebuild()
+
+    def remove(self, product_id: str):
+        """Drop a product deleted by this process"""
+        if self._products.pop(product_id, None) is not None:
+            self._rebuild()
+
+    async def list(self, db: Database, category: Optional[str] = None) -> List[dict]:
+        await self.ensure_loaded(db)
+        if category:
+            return self._by_category.get(category, [])
+        return self._all
+
+    async def get(self, db: Database, product_id: str) -> Optional[dict]:
+        await self.ensure_loaded(db)
+        product = self._products.get(product_id)
+        if product is None:
+            # May have been created on another worker since the last poll
+            response = await db.execute(db.table("products").select("*").eq("id", product_id).limit(1))
+            if response.data:
+                product = response.data[0]
+                self.upsert(product)
+        return product
+
+    async def run(self, db: Database):
+        """Background refresh loop, started from lifespan"""
+        while True:
+            try:
+                if not self.loaded or time.monotonic() - self._loaded_at >= self.full_reload_interval:
+                    await self.load(db)
+                else:
+                    await self.refresh(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Product catalog refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+
+catalog = ProductCatalog()
@@ -0,0 +1,184 @@
+"""Shared, pooled Supabase access for the whole app.
+
+A single :class:`Database` is built in the ``lifespan`` hook in main.py and
+handed to route handlers through the :func:`get_db` dependency. It owns one
+pooled HTTP/2 keep-alive connection to PostgREST, so requests reuse TLS
+connections instead of every router module opening its own.
+
+The supabase-py client is synchronous: every ``.execute()`` performs a blocking
+HTTP round trip. :meth:`Database.execute` and :meth:`Database.run_sync` run
+those calls on a bounded worker-thread pool so a slow query never stalls the
+event loop, other requests or the chat WebSockets.
+"""
+
+import os
+import logging
+import time
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import httpx
+from anyio import CapacityLimiter, to_thread
+from fastapi.requests import HTTPConnection
+from postgrest import SyncPostgrestClient
+from supabase import create_client, Client
+from supabase.lib.client_options import ClientOptions
+
+from metrics import record_db_bytes, record_db_call
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass
+class DatabaseSettings:
+    url: str
+    key: str
+    pool_size: int = 20
+    keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    http2: bool = True
+    timeout: float = 10.0
+    connect_timeout: float = 5.0
+    max_concurrency: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "DatabaseSettings":
+        url = os.getenv("SUPABASE_URL")
+        key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
+        if not url or not key:
+            raise ValueError("Missing Supabase credentials")
+
+        pool_size = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+        max_concurrency = os.getenv("DB_MAX_CONCURRENCY")
+        return cls(
+            url=url,
+            key=key,
+            pool_size=pool_size,
+            keepalive_connections=int(os.getenv("SUPABASE_KEEPALIVE_CONNECTIONS", str(min(10, pool_size)))),
+            keepalive_expiry=float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30")),
+            http2=_env_bool("SUPABASE_HTTP2", True),
+            timeout=float(os.getenv("SUPABASE_TIMEOUT", "10")),
+            connect_timeout=float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5")),
+            max_concurrency=int(max_concurrency) if max_concurrency else None,
+        )
+
+
+class Database:
+    """App-scoped Supabase client with a shared PostgREST connection pool"""
+
+    def __init__(self, settings: DatabaseSettings):
+        self.settings = settings
+
+        # Used for auth and admin calls only; table access goes through
+        # self.postgrest so sign-in/sign-out on the auth client never swaps the
+        # service-role credentials used for queries.
+        self.client: Client = create_client(
+            settings.url,
+            settings.key,
+            options=ClientOptions(
+                auto_refresh_token=False,
+                persist_session=False,
+                postgrest_client_timeout=settings.timeout,
+            ),
+        )
+
+        self.postgrest = SyncPostgrestClient(
+            f"{settings.url}/rest/v1",
+            headers={"apikey": settings.key, "Authorization": f"Bearer {settings.key}"},
+            timeout=settings.timeout,
+        )
+        default_session = self.postgrest.session
+        self._session = httpx.Client(
+            base_url=default_session.base_url,
+            headers=default_session.headers,
+            timeout=httpx.Timeout(settings.timeout, connect=settings.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=settings.pool_size,
+                max_keepalive_connections=settings.keepalive_connections,
+                keepalive_expiry=settings.keepalive_expiry,
+            ),
+            http2=settings.http2,
+            follow_redirects=True,
+            event_hooks={"response": [self._on_response]},
+        )
+        default_session.close()
+        self.postgrest.session = self._session
+
+        # Extra threads beyond the pool size would only queue for a connection
+        self._limiter = CapacityLimiter(settings.max_concurrency or settings.pool_size)
+        self._in_flight = 0
+
+    @property
+    def auth(self):
+        return self.client.auth
+
+    def table(self, table_name: str):
+        """Start a PostgREST query on a table"""
+        return self.postgrest.from_(table_name)
+
+    def rpc(self, func: str, params: Optional[Dict[str, Any]] = None):
+        """Start a PostgREST call to a database function"""
+        return self.postgrest.rpc(func, params or {})
+
+    async def run_sync(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking Supabase call (auth, storage, ...) off the event loop"""
+        self._in_flight += 1
+        start = time.perf_counter()
+        error = False
+        try:
+            return await to_thread.run_sync(partial(func, *args, **kwargs), limiter=self._limiter)
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._in_flight -= 1
+            record_db_call(time.perf_counter() - start, error)
+
+    async def execute(self, query: Any) -> Any:
+        """Execute a PostgREST query builder off the event loop and return its response"""
+        return await self.run_sync(query.execute)
+
+    @staticmethod
+    def _on_response(response: httpx.Response):
+        # Runs on the worker thread; the body is read here so its size is known
+        response.read()
+        record_db_bytes(response.num_bytes_downloaded)
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool and worker usage, for health checks and dashboards"""
+        pool = getattr(getattr(self._session, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        limiter = self._limiter.statistics()
+
+        return {
+            "max_connections": self.settings.pool_size,
+            "max_keepalive_connections": self.settings.keepalive_connections,
+            "keepalive_expiry": self.settings.keepalive_expiry,
+            "http2": self.settings.http2,
+            "open_connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+            "in_flight": self._in_flight,
+            "workers_busy": limiter.borrowed_tokens,
+            "workers_total": limiter.total_tokens,
+            "waiting": limiter.tasks_waiting,
+        }
+
+    def close(self):
+        self._session.close()
+
+
+def get_db(connection: HTTPConnection) -> Database:
+    """FastAPI dependency returning the app-scoped Database (HTTP and WebSocket routes)"""
+    return connection.app.state.db
@@ -0,0 +1,56 @@
+"""Cached distinct values for filter dropdowns.
+
+Departments, positions and design/service categories change rarely but are
+read on every dropdown render. Each list is read from a ``SELECT DISTINCT``
+view (migrations/010_lookup_views.sql) and cached; the write handlers for
+staff, designs and services drop the lists they may have changed, ``lifespan``
+warms all of them at startup, and entries expire after ``LOOKUP_CACHE_TTL``
+seconds to pick up writes made by other workers.
+"""
+
+import logging
+import os
+from typing import List
+
+from cache import TTLCache
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "600"))
+
+# lookup name -> view holding its distinct values
+LOOKUP_VIEWS = {
+    "departments": "staff_departments",
+    "positions": "staff_positions",
+    "design_categories": "marketplace_design_categories",
+    "service_categories": "service_categories",
+}
+
+
+class LookupCache:
+    def __init__(self, ttl: float = LOOKUP_CACHE_TTL):
+        self._values = TTLCache(ttl=ttl, maxsize=len(LOOKUP_VIEWS))
+
+    async def get(self, name: str, db: Database) -> List[str]:
+        values = self._values.get(name)
+        if values is None:
+            response = await db.execute(db.table(LOOKUP_VIEWS[name]).select("value").order("value"))
+            values = [row["value"] for row in response.data]
+            self._values.set(name, values)
+        return values
+
+    def invalidate(self, *names: str):
+        for name in names:
+            self._values.delete(name)
+
+    async def warm(self, db: Database):
+        for name in LOOKUP_VIEWS:
+            try:
+                await self.get(name, db)
+            except Exception as e:
+                # Not fatal: the first request loads it instead
+                logger.warning(f"Failed to warm {name} lookup: {e}")
+
+
+lookups = LookupCache()
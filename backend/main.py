@@ -1,29 +1,31 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
-from supabase import create_client, Client
 from ably import AblyRest
+import asyncio
 import logging
 
-# Load environment variables
+# Load environment variables (before app modules read their settings)
 load_dotenv()
 
+from catalog import catalog
+from database import Database, DatabaseSettings, get_db
+from lookups import lookups
+from messaging.ably_publisher import CHAT_DELIVERY, AblyPublisher
+from messaging.pubsub import create_broker
+from messaging.writer import message_writer
+from metrics import MetricsMiddleware, metrics_response
+from pagination import NEXT_CURSOR_HEADER
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Supabase configuration
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("Missing Supabase credentials")
-
-# Create Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Supabase configuration (the shared client itself is built in lifespan)
+database_settings = DatabaseSettings.from_env()
 
 # Ably configuration
 ABLY_API_KEY = os.getenv("ABLY_API_KEY")
@@ -33,23 +35,35 @@ else:
     logger.warning("Ably API key not found")
     ably = None
 
-# Security
-security = HTTPBearer()
+if CHAT_DELIVERY == "ably" and ably is None:
+    raise ValueError("CHAT_DELIVERY=ably requires ABLY_API_KEY")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Zavolah API server...")
+    app.state.db = Database(database_settings)
+    catalog_refresh = asyncio.create_task(catalog.run(app.state.db))
+    await lookups.warm(app.state.db)
+    await chat.manager.start(create_broker(), AblyPublisher(ably) if CHAT_DELIVERY == "ably" else None)
+    message_flush = asyncio.create_task(message_writer.run(app.state.db))
     yield
     # Shutdown
     logger.info("Shutting down Zavolah API server...")
+    await chat.manager.stop()
+    # Write out chat messages still pending in write-behind mode
+    message_writer.close()
+    await message_flush
+    catalog_refresh.cancel()
+    app.state.db.close()
 
 # Create FastAPI app
 app = FastAPI(
     title="Zavolah API",
     description="Backend API for Zavolah Energy Hub",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -59,20 +73,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
-# Authentication middleware
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get current user from JWT token"""
-    try:
-        # Verify token with Supabase
-        user = supabase.auth.get_user(credentials.credentials)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return user
-    except Exception as e:
-        logger.error(f"Authentication error: {e}")
-        raise HTTPException(status_code=401, detail="Authentication failed")
+# Request latency and Supabase round-trip metrics
+app.add_middleware(MetricsMiddleware)
 
 # Routes
 @app.get("/")
@@ -80,8 +85,12 @@ async def root():
     return {"message": "Zavolah API is running!", "version": "1.0.0"}
 
 @app.get("/health")
-async def health_check():
-    return {"status": "healthy", "database": "connected"}
+async def health_check(db: Database = Depends(get_db)):
+    return {"status": "healthy", "database": "connected", "database_pool": db.pool_stats()}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return metrics_response()
 
 # Import route modules
 from routes import auth, products, orders, users, marketplace, staff, referrals, payments, chat, services
@@ -100,4 +109,5 @@ app.include_router(services.router, prefix="/api/services", tags=["Services"])
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # permessage-deflate for the chat WebSocket, used when the client offers it
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_per_message_deflate=True)
@@ -0,0 +1 @@
+# Real-time chat infrastructure used by routes/chat.py
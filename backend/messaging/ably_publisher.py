@@ -0,0 +1,145 @@
+"""Chat delivery through Ably instead of the API's own WebSockets.
+
+With ``CHAT_DELIVERY=ably`` (and ``ABLY_API_KEY`` set), new messages and
+read receipts are published to one Ably channel per room,
+``chat:room:{room_id}``, and personal events to ``chat:user:{user_id}``.
+Clients subscribe there with a token from ``GET /api/chat/ably-token``,
+limited to subscribing to their own user channel and the rooms they belong
+to (a client that joins a room fetches a new token).
+
+During the migration every event is still delivered to ``/api/chat/ws``
+sockets as well, so clients not yet moved over keep working; a client should
+receive through one of the two, not both. Once every client is on Ably, set
+``CHAT_ABLY_SOCKET_DELIVERY=false``: sockets then only carry sends, and the
+workers stop resolving room members and fanning out to sockets.
+
+Publishes are buffered and sent every ``CHAT_ABLY_BATCH_MS`` milliseconds
+(or once ``CHAT_ABLY_BATCH_SIZE`` events are waiting), one REST call per
+channel carrying all of its queued events.
+
+:class:`FakeAbly` records publishes in memory, for tests.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Iterable, List
+
+from ably.types.message import Message
+
+logger = logging.getLogger(__name__)
+
+CHAT_DELIVERY = os.getenv("CHAT_DELIVERY", "websocket")
+CHAT_ABLY_BATCH_MS = float(os.getenv("CHAT_ABLY_BATCH_MS", "25"))
+CHAT_ABLY_BATCH_SIZE = int(os.getenv("CHAT_ABLY_BATCH_SIZE", "100"))
+CHAT_ABLY_SOCKET_DELIVERY = os.getenv("CHAT_ABLY_SOCKET_DELIVERY", "true").strip().lower() in ("1", "true", "yes", "on")
+CHAT_ABLY_TOKEN_TTL = float(os.getenv("CHAT_ABLY_TOKEN_TTL", "3600"))
+
+CHAT_DELIVERY_MODES = ("websocket", "ably")
+if CHAT_DELIVERY not in CHAT_DELIVERY_MODES:
+    raise ValueError(f"CHAT_DELIVERY must be one of {', '.join(CHAT_DELIVERY_MODES)}")
+
+
+def room_channel(room_id: str) -> str:
+    return f"chat:room:{room_id}"
+
+
+def user_channel(user_id: str) -> str:
+    return f"chat:user:{user_id}"
+
+
+class AblyPublisher:
+    def __init__(self, client: Any, interval_ms: float = CHAT_ABLY_BATCH_MS, batch_size: int = CHAT_ABLY_BATCH_SIZE, socket_delivery: bool = CHAT_ABLY_SOCKET_DELIVERY, token_ttl: float = CHAT_ABLY_TOKEN_TTL):
+        self.client = client
+        self.interval = interval_ms / 1000
+        self.batch_size = batch_size
+        # Whether events are also fanned out to the API's own WebSockets
+        self.socket_delivery = socket_delivery
+        self.token_ttl = token_ttl
+        # channel name -> messages waiting to be published, in order
+        self._pending: Dict[str, List[Message]] = {}
+        self._count = 0
+        self._wake = asyncio.Event()
+        self._closing = False
+
+    def publish(self, channel: str, name: str, data: Dict[str, Any]):
+        """Queue an event for a channel without waiting"""
+        self._pending.setdefault(channel, []).append(Message(name=name, data=data))
+        self._count += 1
+        if self._count >= self.batch_size:
+            self._wake.set()
+
+    async def token_request(self, user_id: str, room_ids: Iterable[str]) -> Dict[str, Any]:
+        """Signed token request letting a client subscribe to its user channel and its rooms only"""
+        capability = {user_channel(user_id): ["subscribe"]}
+        capability.update({room_channel(room_id): ["subscribe"] for room_id in room_ids})
+        token_request = await self.client.auth.create_token_request({
+            "client_id": user_id,
+            "capability": capability,
+            "ttl": self.token_ttl * 1000
+        })
+        return token_request.to_dict()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending, self._count = self._pending, {}, 0
+
+        results = await asyncio.gather(
+            *(self._publish_channel(channel, messages) for channel, messages in pending.items()),
+            return_exceptions=True
+        )
+        for (channel, messages), result in zip(pending.items(), results):
+            if isinstance(result, Exception):
+                # Live delivery only: clients recover missed events from history
+                logger.error(f"Failed to publish {len(messages)} chat events to {channel}: {result}")
+
+    async def _publish_channel(self, channel: str, messages: List[Message]):
+        ably_channel = self.client.channels.get(channel)
+        for start in range(0, len(messages), self.batch_size):
+            await ably_channel.publish(messages=messages[start:start + self.batch_size])
+
+    async def run(self):
+        """Background publish loop, started with the chat manager in lifespan"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+            if self._closing:
+                return
+
+    def close(self):
+        """Ask the publish loop to send what is pending and exit"""
+        self._closing = True
+        self._wake.set()
+
+
+class FakeAblyChannel:
+    def __init__(self, name: str, published: Dict[str, List[Message]]):
+        self.name = name
+        self._published = published
+
+    async def publish(self, messages: List[Message]):
+        self._published.setdefault(self.name, []).extend(messages)
+
+
+class FakeAblyChannels:
+    def __init__(self):
+        self.published: Dict[str, List[Message]] = {}
+
+    def get(self, name: str) -> FakeAblyChannel:
+        return FakeAblyChannel(name, self.published)
+
+
+class FakeAbly:
+    """Stands in for AblyRest in tests; ``published`` maps channel names to the messages sent"""
+
+    def __init__(self):
+        self.channels = FakeAblyChannels()
+
+    @property
+    def published(self) -> Dict[str, List[Message]]:
+        return self.channels.published
@@ -0,0 +1,119 @@
+"""Per-connection outbound queues for chat WebSockets.
+
+Each socket gets a bounded queue drained by its own writer task, so
+broadcasting to a room is a set of non-blocking enqueues and one slow client
+never delays delivery to the others. When a client's queue is full, the
+``CHAT_SLOW_CONSUMER_POLICY`` decides what happens:
+
+* ``drop`` - discard the new message for that client;
+* ``coalesce`` - discard the oldest queued message so the client stays on the
+  most recent traffic;
+* ``disconnect`` - close the socket (code 1013, try again later) so the client
+  reconnects and catches up.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import uuid
+
+from fastapi import WebSocket
+
+from messaging.protocol import JSON, Item, Protocol
+
+logger = logging.getLogger(__name__)
+
+CHAT_SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", "256"))
+CHAT_SLOW_CONSUMER_POLICY = os.getenv("CHAT_SLOW_CONSUMER_POLICY", "drop")
+
+SLOW_CONSUMER_POLICIES = ("drop", "coalesce", "disconnect")
+if CHAT_SLOW_CONSUMER_POLICY not in SLOW_CONSUMER_POLICIES:
+    raise ValueError(f"CHAT_SLOW_CONSUMER_POLICY must be one of {', '.join(SLOW_CONSUMER_POLICIES)}")
+
+# WebSocket close code for "try again later"
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+class Connection:
+    # A user may hold several of these at once (web app, phone, ...), so the
+    # per-connection state is kept deliberately small
+    __slots__ = ("id", "websocket", "user_id", "protocol", "policy", "queue", "writer", "dropped", "closed")
+
+    def __init__(self, websocket: WebSocket, user_id: str, protocol: Protocol = JSON, queue_size: int = CHAT_SEND_QUEUE_SIZE, policy: str = CHAT_SLOW_CONSUMER_POLICY):
+        # Unique across workers, so pub/sub events can name the originating socket
+        self.id = uuid.uuid4().hex
+        self.websocket = websocket
+        self.user_id = user_id
+        # Wire format negotiated for this socket (messaging/protocol.py)
+        self.protocol = protocol
+        self.policy = policy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer = None
+        self.dropped = 0
+        self.closed = False
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by this connection's own bookkeeping and queued messages"""
+        queued = getattr(self.queue, "_queue", ())
+        return (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.queue)
+            + sys.getsizeof(queued)
+            + sum(sys.getsizeof(message) for message in queued)
+            + (sys.getsizeof(self.writer) if self.writer is not None else 0)
+        )
+
+    def start(self):
+        self.writer = asyncio.create_task(self._drain())
+
+    def send(self, message: Item) -> bool:
+        """Queue an item encoded with this connection's protocol without waiting; returns False if it was not queued"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        self.dropped += 1
+        if self.policy == "coalesce":
+            self.queue.get_nowait()
+            self.queue.put_nowait(message)
+            return True
+        if self.policy == "disconnect":
+            logger.warning(f"Closing slow chat connection for user {self.user_id}")
+            asyncio.create_task(self.close(SLOW_CONSUMER_CLOSE_CODE))
+        return False
+
+    async def _drain(self):
+        try:
+            while True:
+                items = [await self.queue.get()]
+                # Whatever else is already queued goes out in the same frame
+                while len(items) < self.protocol.batch_size and not self.queue.empty():
+                    items.append(self.queue.get_nowait())
+
+                frame = self.protocol.frame(items)
+                if self.protocol.binary:
+                    await self.websocket.send_bytes(frame)
+                else:
+                    await self.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Socket went away; the receive loop will clean up the connection
+            logger.info(f"Chat writer for user {self.user_id} stopped: {e}")
+            self.closed = True
+
+    def stop(self):
+        self.closed = True
+        if self.writer is not None:
+            self.writer.cancel()
+
+    async def close(self, code: int = 1000):
+        self.stop()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
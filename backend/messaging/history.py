@@ -0,0 +1,133 @@
+"""Recent messages per room, kept in memory for history reads.
+
+Nearly every history read is the newest page of a room, fetched when the room
+is opened. Each active room keeps a bounded buffer of its last
+``CHAT_HISTORY_SIZE`` messages: the first read of a room loads it from the
+database, and after that every message broadcast to the room (from any worker,
+see messaging/pubsub.py) is appended. First-page reads and WebSocket
+reconnect catch-up are answered from the buffer; older pages and rooms whose
+buffer does not reach back far enough still go to the database.
+
+Edits, deletions and read flags are not tracked message by message: the
+handlers that change them drop the room's buffer, and buffers expire after
+``CHAT_HISTORY_TTL`` seconds so changes made on other workers are picked up.
+"""
+
+import asyncio
+import os
+from collections import deque
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from cache import TTLCache
+
+CHAT_HISTORY_SIZE = int(os.getenv("CHAT_HISTORY_SIZE", "100"))
+CHAT_HISTORY_TTL = float(os.getenv("CHAT_HISTORY_TTL", "300"))
+CHAT_HISTORY_MAX_ROOMS = int(os.getenv("CHAT_HISTORY_MAX_ROOMS", "1000"))
+# Most messages replayed to a reconnecting socket from the database
+CHAT_CATCH_UP_LIMIT = int(os.getenv("CHAT_CATCH_UP_LIMIT", "500"))
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse an ISO 8601 timestamp; naive values are taken as UTC"""
+    timestamp = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
+class RoomBuffer:
+    __slots__ = ("messages", "complete")
+
+    def __init__(self, rows: List[dict], size: int, complete: bool):
+        # Oldest first; the newest message is messages[-1]
+        self.messages = deque(rows, maxlen=size)
+        # True while the buffer holds the room's entire history
+        self.complete = complete
+
+    def append(self, row: dict):
+        if len(self.messages) == self.messages.maxlen:
+            self.complete = False
+        self.messages.append(row)
+
+
+class RecentMessages:
+    def __init__(self, size: int = CHAT_HISTORY_SIZE, ttl: float = CHAT_HISTORY_TTL, max_rooms: int = CHAT_HISTORY_MAX_ROOMS):
+        self.size = size
+        self._rooms = TTLCache(ttl=ttl, maxsize=max_rooms)
+        # One database load per room at a time, shared by concurrent readers
+        self._loading: Dict[str, asyncio.Future] = {}
+        # Messages broadcast while a room's buffer is being loaded
+        self._arrived: Dict[str, List[dict]] = {}
+
+    async def ensure_loaded(self, room_id: str, fetch: Callable[[int], Awaitable[List[dict]]]):
+        """Load a room's buffer unless it is present
+
+        ``fetch(count)`` returns at most ``count`` of the room's newest rows,
+        newest first. One row more than the buffer holds is requested, so the
+        buffer is marked complete only when the room proved to have fewer.
+        """
+        if self._rooms.get(room_id) is not None:
+            return
+
+        pending = self._loading.get(room_id)
+        if pending is not None:
+            await asyncio.shield(pending)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[room_id] = future
+        self._arrived[room_id] = []
+        try:
+            count = self.size + 1
+            rows = await fetch(count)
+            complete = len(rows) < count
+            rows = list(reversed(rows[:self.size]))
+            seen = {row["id"] for row in rows}
+            rows.extend(row for row in self._arrived[room_id] if row["id"] not in seen)
+            self._rooms.set(room_id, RoomBuffer(rows, self.size, complete))
+            future.set_result(None)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged
+            future.exception()
+            raise
+        finally:
+            del self._loading[room_id]
+            del self._arrived[room_id]
+
+    def append(self, room_id: str, row: dict):
+        arrived = self._arrived.get(room_id)
+        if arrived is not None:
+            arrived.append(row)
+        buffer = self._rooms.get(room_id)
+        if buffer is not None:
+            buffer.append(row)
+
+    def latest(self, room_id: str, count: int) -> Optional[List[dict]]:
+        """Up to ``count`` newest messages, newest first, or None if the room is not buffered
+
+        Returns fewer than ``count`` rows only when that is the room's whole
+        history, so ``count`` may include a look-ahead row.
+        """
+        buffer = self._rooms.get(room_id)
+        if buffer is None:
+            return None
+        if len(buffer.messages) < count and not buffer.complete:
+            return None
+        rows = list(buffer.messages)[-count:]
+        rows.reverse()
+        return rows
+
+    def since(self, room_id: str, timestamp: datetime) -> Optional[List[dict]]:
+        """Messages newer than ``timestamp``, oldest first, or None if the buffer does not reach back that far"""
+        buffer = self._rooms.get(room_id)
+        if buffer is None:
+            return None
+        messages = list(buffer.messages)
+        if not buffer.complete and (not messages or parse_timestamp(messages[0]["created_at"]) > timestamp):
+            return None
+        return [row for row in messages if parse_timestamp(row["created_at"]) > timestamp]
+
+    def drop(self, room_id: str):
+        self._rooms.delete(room_id)
@@ -0,0 +1,67 @@
+"""In-memory room -> members index for chat fan-out.
+
+Broadcasting a message needs the room's participants. Instead of querying
+``chat_participants`` for every message, members are loaded once per room and
+then kept current by the participant and room handlers in routes/chat.py.
+Entries expire after ``CHAT_MEMBERSHIP_TTL`` seconds as a safety net for
+changes made by other workers or directly in the database.
+"""
+
+import asyncio
+import os
+from typing import Dict, Iterable, Set
+
+from cache import TTLCache
+from database import Database
+
+CHAT_MEMBERSHIP_TTL = float(os.getenv("CHAT_MEMBERSHIP_TTL", "60"))
+CHAT_MEMBERSHIP_MAX_ROOMS = int(os.getenv("CHAT_MEMBERSHIP_MAX_ROOMS", "10000"))
+
+
+class RoomMembership:
+    def __init__(self, ttl: float = CHAT_MEMBERSHIP_TTL, max_rooms: int = CHAT_MEMBERSHIP_MAX_ROOMS):
+        self._rooms = TTLCache(ttl=ttl, maxsize=max_rooms)
+        # One database load per room at a time, shared by concurrent senders
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    async def members(self, room_id: str, db: Database) -> Set[str]:
+        """User ids in a room, loaded from the database on first use"""
+        members = self._rooms.get(room_id)
+        if members is not None:
+            return members
+
+        pending = self._loading.get(room_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[room_id] = future
+        try:
+            response = await db.execute(db.table("chat_participants").select("user_id").eq("room_id", room_id))
+            members = {participant["user_id"] for participant in response.data}
+            self._rooms.set(room_id, members)
+            future.set_result(members)
+            return members
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged
+            future.exception()
+            raise
+        finally:
+            del self._loading[room_id]
+
+    def set(self, room_id: str, user_ids: Iterable[str]):
+        self._rooms.set(room_id, set(user_ids))
+
+    def add(self, room_id: str, user_id: str):
+        members = self._rooms.get(room_id)
+        if members is not None:
+            members.add(user_id)
+
+    def remove(self, room_id: str, user_id: str):
+        members = self._rooms.get(room_id)
+        if members is not None:
+            members.discard(user_id)
+
+    def drop(self, room_id: str):
+        self._rooms.delete(room_id)
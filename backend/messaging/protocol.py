@@ -0,0 +1,159 @@
+"""Wire formats for the chat WebSocket, negotiated per connection.
+
+Clients pick a format with the WebSocket subprotocol header:
+
+* no subprotocol - ``json``: one full message row (or event object) per text
+  frame, as the socket has always sent;
+* ``zavolah.compact.v1`` - trimmed JSON envelopes with short field names;
+* ``zavolah.msgpack.v1`` - the same envelopes encoded with msgpack, in binary
+  frames.
+
+Compact envelopes drop fields the client already knows (``updated_at``,
+``is_read`` of a new message, empty attachments)::
+
+    {"e": "m", "i": id, "r": room_id, "s": sender_id, "t": message_type,
+     "c": content, "a": [attachments], "ts": created_at}
+    {"e": "rr", "r": room_id, "u": user_id, "i": message_id, "ts": read_up_to}
+
+With the compact formats, events queued for a connection are sent together
+as one array per frame (up to ``CHAT_WS_BATCH_SIZE``), and the client sends
+messages with the same short names (``r``, ``c``, ``t``, ``a``). Frames are
+further compressed with permessage-deflate when the client offers it (on by
+default in uvicorn).
+
+Each event is encoded once per format and shared by every connection using
+that format.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import msgpack
+
+CHAT_WS_BATCH_SIZE = int(os.getenv("CHAT_WS_BATCH_SIZE", "32"))
+
+Item = Union[str, bytes]
+
+MESSAGE_FIELDS = {
+    "id": "i",
+    "room_id": "r",
+    "sender_id": "s",
+    "message_type": "t",
+    "content": "c",
+    "attachments": "a",
+    "created_at": "ts",
+}
+EVENT_FIELDS = {
+    "type": "e",
+    "room_id": "r",
+    "user_id": "u",
+    "message_id": "i",
+    "read_up_to": "ts",
+}
+EVENT_TYPES = {
+    "message": "m",
+    "read_receipt": "rr",
+}
+INCOMING_FIELDS = {short: name for name, short in MESSAGE_FIELDS.items()}
+
+
+def _compact_message(row: Dict[str, Any]) -> Dict[str, Any]:
+    envelope = {"e": EVENT_TYPES["message"]}
+    for name, short in MESSAGE_FIELDS.items():
+        value = row.get(name)
+        if value is not None and value != []:
+            envelope[short] = value
+    return envelope
+
+
+def _compact_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    envelope = {}
+    for name, value in event.items():
+        if value is None:
+            continue
+        if name == "type":
+            value = EVENT_TYPES.get(value, value)
+        envelope[EVENT_FIELDS.get(name, name)] = value
+    return envelope
+
+
+class Protocol:
+    """Full JSON rows, one per text frame (clients that do not negotiate)"""
+
+    name = "json"
+    subprotocol: Optional[str] = None
+    binary = False
+    batch_size = 1
+
+    def encode_message(self, row: Dict[str, Any]) -> Item:
+        return json.dumps(row)
+
+    def encode_event(self, event: Dict[str, Any]) -> Item:
+        return json.dumps(event)
+
+    def frame(self, items: Sequence[Item]) -> Item:
+        return items[0]
+
+    def decode(self, data: Item) -> Dict[str, Any]:
+        return json.loads(data)
+
+
+class CompactJSONProtocol(Protocol):
+    name = "compact"
+    subprotocol = "zavolah.compact.v1"
+    batch_size = CHAT_WS_BATCH_SIZE
+
+    def encode_message(self, row: Dict[str, Any]) -> Item:
+        return json.dumps(_compact_message(row), separators=(",", ":"))
+
+    def encode_event(self, event: Dict[str, Any]) -> Item:
+        return json.dumps(_compact_event(event), separators=(",", ":"))
+
+    def frame(self, items: Sequence[Item]) -> Item:
+        # Items are already encoded, so the batch is assembled without re-encoding
+        return "[" + ",".join(items) + "]"
+
+    def decode(self, data: Item) -> Dict[str, Any]:
+        return {INCOMING_FIELDS.get(key, key): value for key, value in json.loads(data).items()}
+
+
+class MsgpackProtocol(Protocol):
+    name = "msgpack"
+    subprotocol = "zavolah.msgpack.v1"
+    binary = True
+    batch_size = CHAT_WS_BATCH_SIZE
+
+    def encode_message(self, row: Dict[str, Any]) -> Item:
+        return msgpack.packb(_compact_message(row))
+
+    def encode_event(self, event: Dict[str, Any]) -> Item:
+        return msgpack.packb(_compact_event(event))
+
+    def frame(self, items: Sequence[Item]) -> Item:
+        # msgpack array header followed by the already packed items
+        count = len(items)
+        if count < 16:
+            header = bytes([0x90 | count])
+        else:
+            header = b"\xdc" + count.to_bytes(2, "big")
+        return header + b"".join(items)
+
+    def decode(self, data: Item) -> Dict[str, Any]:
+        if isinstance(data, str):
+            data = data.encode()
+        return {INCOMING_FIELDS.get(key, key): value for key, value in msgpack.unpackb(data).items()}
+
+
+JSON = Protocol()
+PROTOCOLS: List[Protocol] = [CompactJSONProtocol(), MsgpackProtocol()]
+
+
+def negotiate(offered: Sequence[str]) -> Protocol:
+    """Pick the first subprotocol offered by the client that we support"""
+    by_subprotocol = {protocol.subprotocol: protocol for protocol in PROTOCOLS}
+    for subprotocol in offered:
+        protocol = by_subprotocol.get(subprotocol)
+        if protocol is not None:
+            return protocol
+    return JSON
@@ -0,0 +1,157 @@
+"""Pub/sub fan-out of chat events between workers.
+
+Each worker only holds its own WebSockets, so a message sent on one worker has
+to reach the sockets held by the others. The sending worker resolves the room
+members once and publishes one event; every worker (the sender included)
+receives it from the broker and delivers it to the recipients connected to
+that worker.
+
+Events are plain JSON-able dicts::
+
+    {"recipients": [user_id, ...], "exclude": connection_id, "room_id": ..., "row": {...}}
+    {"recipients": [user_id, ...], "exclude": None, "event": {"type": ...}}
+
+``row`` is a new chat message; ``event`` is anything else (read receipts).
+``exclude`` names the socket a message was sent from (None for the REST
+API), which already has it; the sender's other devices still receive it.
+Each worker encodes them for its own sockets (messaging/protocol.py).
+
+``CHAT_BROKER`` selects the backend:
+
+* ``memory`` (default) - :class:`InProcessBroker`, for a single worker;
+* ``redis`` - :class:`RedisBroker`, Redis pub/sub at ``CHAT_BROKER_URL``, for
+  several workers or nodes.
+
+:class:`LocalBroker` instances sharing a :class:`LocalBus` behave like workers
+sharing Redis, without a network, for tests.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHAT_BROKER = os.getenv("CHAT_BROKER", "memory")
+CHAT_BROKER_URL = os.getenv("CHAT_BROKER_URL", "redis://localhost:6379/0")
+CHAT_BROKER_CHANNEL = os.getenv("CHAT_BROKER_CHANNEL", "zavolah:chat")
+
+Handler = Callable[[Dict[str, Any]], None]
+
+
+class Broker:
+    """Publishes chat events and hands every received event to this worker's handler"""
+
+    def __init__(self):
+        self.handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+
+    async def publish(self, event: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def close(self):
+        self.handler = None
+
+    def _receive(self, event: Dict[str, Any]):
+        if self.handler is None:
+            return
+        try:
+            self.handler(event)
+        except Exception:
+            logger.exception("Failed to deliver chat event")
+
+
+class InProcessBroker(Broker):
+    """Single-worker backend: events go straight to the local handler"""
+
+    async def publish(self, event: Dict[str, Any]):
+        self._receive(event)
+
+
+class LocalBus:
+    """Shared channel for LocalBrokers, standing in for the network broker"""
+
+    def __init__(self):
+        self.brokers: List["LocalBroker"] = []
+
+
+class LocalBroker(Broker):
+    """Test backend: every broker on the same bus receives every event
+
+    Events are encoded and decoded on the way through, as they would be on the
+    wire, so handlers never share objects with the publisher.
+    """
+
+    def __init__(self, bus: LocalBus):
+        super().__init__()
+        self.bus = bus
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        self.bus.brokers.append(self)
+
+    async def publish(self, event: Dict[str, Any]):
+        payload = json.dumps(event)
+        for broker in list(self.bus.brokers):
+            broker._receive(json.loads(payload))
+
+    async def close(self):
+        if self in self.bus.brokers:
+            self.bus.brokers.remove(self)
+        await super().close()
+
+
+class RedisBroker(Broker):
+    """Multi-worker backend on Redis pub/sub"""
+
+    def __init__(self, url: str = CHAT_BROKER_URL, channel: str = CHAT_BROKER_CHANNEL):
+        super().__init__()
+        import redis.asyncio as redis
+
+        self.channel = channel
+        self._redis = redis.from_url(url)
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def publish(self, event: Dict[str, Any]):
+        await self._redis.publish(self.channel, json.dumps(event))
+
+    async def _listen(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    self._receive(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The client resubscribes when its connection comes back
+                logger.warning(f"Chat broker connection error: {e}")
+                await asyncio.sleep(1)
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.close()
+        await self._redis.close()
+        await super().close()
+
+
+def create_broker(backend: str = CHAT_BROKER) -> Broker:
+    """Build the broker configured by ``CHAT_BROKER``"""
+    if backend == "memory":
+        return InProcessBroker()
+    if backend == "redis":
+        return RedisBroker()
+    raise ValueError(f"Unknown CHAT_BROKER: {backend}")
@@ -0,0 +1,124 @@
+"""Optional write-behind persistence for chat messages.
+
+By default every chat message is inserted into ``messages`` before it is
+broadcast, so database latency sits in front of every delivery. With
+``CHAT_WRITE_BEHIND=true`` the message is given its id and timestamps here,
+broadcast immediately, and written by a background task in batched inserts:
+every ``CHAT_WRITE_BEHIND_INTERVAL_MS`` milliseconds, or as soon as
+``CHAT_WRITE_BEHIND_BATCH_SIZE`` messages are pending. ``lifespan`` flushes
+whatever is still pending on shutdown.
+
+A message can therefore be delivered a few milliseconds before it is readable
+through the history endpoints, and a crash loses at most one interval of
+messages.
+
+Rows the database rejects (bad ids, foreign keys) are isolated by splitting
+the failed batch and dropped with an error log, so one bad message never holds
+back the others. Batches that fail for other reasons (database unreachable)
+are retried, keeping at most ``CHAT_WRITE_BEHIND_MAX_PENDING`` messages.
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import List
+
+from postgrest.exceptions import APIError
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "false").strip().lower() in ("1", "true", "yes", "on")
+CHAT_WRITE_BEHIND_INTERVAL_MS = float(os.getenv("CHAT_WRITE_BEHIND_INTERVAL_MS", "100"))
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BEHIND_BATCH_SIZE", "500"))
+CHAT_WRITE_BEHIND_MAX_PENDING = int(os.getenv("CHAT_WRITE_BEHIND_MAX_PENDING", "10000"))
+
+# SQLSTATE classes that retrying cannot fix: data exceptions, integrity
+# constraint violations, syntax errors / undefined objects
+REJECTED_SQLSTATE_CLASSES = ("22", "23", "42")
+
+
+def _rejected(error: Exception) -> bool:
+    return isinstance(error, APIError) and str(error.code or "")[:2] in REJECTED_SQLSTATE_CLASSES
+
+
+class MessageWriter:
+    def __init__(self, enabled: bool = CHAT_WRITE_BEHIND, interval_ms: float = CHAT_WRITE_BEHIND_INTERVAL_MS, batch_size: int = CHAT_WRITE_BEHIND_BATCH_SIZE, max_pending: int = CHAT_WRITE_BEHIND_MAX_PENDING):
+        self.enabled = enabled
+        self.interval = interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending: List[dict] = []
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._closing = False
+
+    def write(self, row: dict) -> dict:
+        """Complete a message row with its id and timestamps and queue it for insertion"""
+        now = datetime.now(timezone.utc).isoformat()
+        row = {"id": str(uuid.uuid4()), "created_at": now, "updated_at": now, **row}
+        self._pending.append(row)
+        self._trim()
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+        return row
+
+    def _trim(self):
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            logger.error(f"Dropping {excess} oldest unwritten chat messages (write-behind queue full)")
+            del self._pending[:excess]
+
+    async def _insert(self, db: Database, rows: List[dict]) -> List[dict]:
+        """Insert rows, splitting the batch to isolate rejected rows; returns the rows to retry"""
+        try:
+            await db.execute(db.table("messages").insert(rows))
+            return []
+        except Exception as e:
+            if not _rejected(e):
+                logger.error(f"Failed to write {len(rows)} chat messages, will retry: {e}")
+                return rows
+            if len(rows) == 1:
+                logger.error(f"Dropping chat message {rows[0]['id']} rejected by the database: {e}")
+                return []
+        middle = len(rows) // 2
+        return await self._insert(db, rows[:middle]) + await self._insert(db, rows[middle:])
+
+    async def flush(self, db: Database):
+        """Insert everything pending in one statement"""
+        async with self._lock:
+            if not self._pending:
+                return
+            rows, self._pending = self._pending, []
+            retry = await self._insert(db, rows)
+            if retry:
+                # Keep them ahead of newer messages for the next attempt
+                self._pending[:0] = retry
+                self._trim()
+
+    async def run(self, db: Database):
+        """Background flush loop, started in lifespan"""
+        if not self.enabled:
+            return
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush(db)
+            if self._closing:
+                if self._pending:
+                    logger.error(f"Dropping {len(self._pending)} unwritten chat messages on shutdown")
+                return
+
+    def close(self):
+        """Ask the flush loop to write what is pending and exit"""
+        self._closing = True
+        self._wake.set()
+
+
+message_writer = MessageWriter()
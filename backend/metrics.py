@@ -0,0 +1,138 @@
+"""Prometheus metrics for HTTP requests and Supabase round trips.
+
+``MetricsMiddleware`` times every HTTP request and attaches a
+:class:`RequestStats` to the request context. :class:`database.Database` calls
+:func:`record_db_call` / :func:`record_db_bytes` for each PostgREST or auth
+round trip, which accumulate on that object; when the request finishes, the
+totals are observed under the matched route template (``/api/orders/{order_id}``),
+so handlers that fan out into many queries stand out.
+
+Work outside a request (background refreshes, WebSocket traffic) is reported
+under the ``background`` route. Everything is exposed on ``/metrics``.
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+BACKGROUND_ROUTE = "background"
+
+REQUEST_LATENCY = Histogram(
+    "zavolah_http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"]
+)
+REQUEST_ERRORS = Counter(
+    "zavolah_http_request_errors_total",
+    "HTTP requests answered with a 5xx status or an unhandled exception",
+    ["method", "route"]
+)
+DB_ROUND_TRIPS_PER_REQUEST = Histogram(
+    "zavolah_db_round_trips_per_request",
+    "Supabase round trips made while serving one HTTP request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21, 34, 55, 100, 200)
+)
+DB_ROUND_TRIPS = Counter(
+    "zavolah_db_round_trips_total",
+    "Supabase round trips",
+    ["route"]
+)
+DB_LATENCY = Histogram(
+    "zavolah_db_round_trip_duration_seconds",
+    "Latency of a single Supabase round trip, including time queued for a worker",
+    ["route"]
+)
+DB_BYTES_RECEIVED = Counter(
+    "zavolah_db_received_bytes_total",
+    "Bytes received from Supabase",
+    ["route"]
+)
+DB_ERRORS = Counter(
+    "zavolah_db_errors_total",
+    "Supabase round trips that raised an error",
+    ["route"]
+)
+
+
+class RequestStats:
+    __slots__ = ("round_trips", "bytes_received", "errors", "latencies")
+
+    def __init__(self):
+        self.round_trips = 0
+        self.bytes_received = 0
+        self.errors = 0
+        # Observed under the route label once the request has been routed
+        self.latencies = []
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def record_db_call(duration: float, error: bool = False):
+    stats = _request_stats.get()
+    if stats is None:
+        DB_ROUND_TRIPS.labels(BACKGROUND_ROUTE).inc()
+        DB_LATENCY.labels(BACKGROUND_ROUTE).observe(duration)
+        if error:
+            DB_ERRORS.labels(BACKGROUND_ROUTE).inc()
+        return
+
+    stats.round_trips += 1
+    stats.latencies.append(duration)
+    if error:
+        stats.errors += 1
+
+
+def record_db_bytes(num_bytes: int):
+    """Called from the HTTP client's response hook, possibly on a worker thread"""
+    stats = _request_stats.get()
+    if stats is None:
+        DB_BYTES_RECEIVED.labels(BACKGROUND_ROUTE).inc(num_bytes)
+    else:
+        stats.bytes_received += num_bytes
+
+
+def _route_template(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+
+            route = _route_template(request)
+            REQUEST_LATENCY.labels(request.method, route, str(status)).observe(elapsed)
+            if status >= 500:
+                REQUEST_ERRORS.labels(request.method, route).inc()
+
+            DB_ROUND_TRIPS_PER_REQUEST.labels(route).observe(stats.round_trips)
+            if stats.round_trips:
+                DB_ROUND_TRIPS.labels(route).inc(stats.round_trips)
+                db_latency = DB_LATENCY.labels(route)
+                for duration in stats.latencies:
+                    db_latency.observe(duration)
+            if stats.bytes_received:
+                DB_BYTES_RECEIVED.labels(route).inc(stats.bytes_received)
+            if stats.errors:
+                DB_ERRORS.labels(route).inc(stats.errors)
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
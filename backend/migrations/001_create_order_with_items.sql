@@ -0,0 +1,28 @@
+-- Create an order and all of its line items in one call / one transaction.
+-- Used by POST /api/orders so checkout is a single round trip regardless of
+-- cart size and never leaves an order without its items.
+CREATE OR REPLACE FUNCTION create_order_with_items(p_order JSONB, p_items JSONB)
+RETURNS SETOF orders
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    new_order orders;
+BEGIN
+    INSERT INTO orders (user_id, total, payment_method, shipping_address, status, payment_status)
+    VALUES (
+        (p_order->>'user_id')::UUID,
+        (p_order->>'total')::DECIMAL,
+        p_order->>'payment_method',
+        p_order->'shipping_address',
+        'pending',
+        'pending'
+    )
+    RETURNING * INTO new_order;
+
+    INSERT INTO order_items (order_id, product_id, quantity, price)
+    SELECT new_order.id, item.product_id, item.quantity, item.price
+    FROM jsonb_to_recordset(p_items) AS item(product_id UUID, quantity INTEGER, price DECIMAL);
+
+    RETURN NEXT new_order;
+END;
+$$;
@@ -0,0 +1,19 @@
+-- Keep products.updated_at current so the in-process catalog snapshot
+-- (backend/catalog.py) can poll for changed rows incrementally.
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS products_set_updated_at ON products;
+CREATE TRIGGER products_set_updated_at
+    BEFORE UPDATE ON products
+    FOR EACH ROW
+    EXECUTE FUNCTION set_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_products_updated_at ON products(updated_at);
@@ -0,0 +1,22 @@
+-- Composite indexes matching the (created_at DESC, id DESC) keyset order used
+-- by the list endpoints (backend/pagination.py), so every page is an index
+-- range scan regardless of depth.
+CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_user_created_at_id ON orders(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_payments_created_at_id ON payments(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_payments_user_created_at_id ON payments(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_refunds_created_at_id ON refunds(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_staff_created_at_id ON staff(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_staff_tasks_created_at_id ON staff_tasks(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_staff_tasks_assigned_created_at_id ON staff_tasks(assigned_to, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_referrals_created_at_id ON referrals(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_referral_earnings_created_at_id ON referral_earnings(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_services_created_at_id ON services(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_bookings_created_at_id ON bookings(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_bookings_user_created_at_id ON bookings(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_service_reviews_created_at_id ON service_reviews(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_marketplace_designs_created_at_id ON marketplace_designs(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_marketplace_sellers_created_at_id ON marketplace_sellers(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_marketplace_purchases_created_at_id ON marketplace_purchases(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_chat_rooms_created_at_id ON chat_rooms(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_room_created_at_id ON messages(room_id, created_at DESC, id DESC);
@@ -0,0 +1,156 @@
+-- Maintained unread-message counts per (user, room), so the unread badge is
+-- read from one row per room instead of counting messages
+-- (GET /api/chat/user/{user_id}/unread-count and /unread-counts).
+--
+-- A message is unread for a participant (other than its sender) while it is
+-- newer than that participant's read watermark, chat_participants.last_read_at
+-- (NULL: nothing read yet). Statement-level triggers keep the counts current
+-- for single and batched message writes and for members joining or leaving;
+-- mark_room_read (005) recomputes the reader's own row when the watermark
+-- moves. The shared messages.is_read flag plays no part.
+
+-- Each participant's read watermark: messages up to it are read for that
+-- user (set by mark_room_read, 005)
+ALTER TABLE chat_participants ADD COLUMN IF NOT EXISTS last_read_at TIMESTAMPTZ;
+
+CREATE TABLE IF NOT EXISTS chat_unread_counters (
+    user_id UUID NOT NULL,
+    room_id UUID NOT NULL REFERENCES chat_rooms(id) ON DELETE CASCADE,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, room_id)
+);
+
+CREATE OR REPLACE FUNCTION chat_unread_apply(p_user_id UUID, p_room_id UUID, p_delta INTEGER)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    INSERT INTO chat_unread_counters (user_id, room_id, unread_count)
+    VALUES (p_user_id, p_room_id, GREATEST(p_delta, 0))
+    ON CONFLICT (user_id, room_id) DO UPDATE
+        SET unread_count = GREATEST(chat_unread_counters.unread_count + p_delta, 0),
+            updated_at = NOW();
+$$;
+
+CREATE OR REPLACE FUNCTION chat_unread_on_insert()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM chat_unread_apply(c.user_id, c.room_id, c.delta::INTEGER)
+    FROM (
+        SELECT p.user_id, m.room_id, COUNT(*) AS delta
+        FROM new_messages m
+        JOIN chat_participants p ON p.room_id = m.room_id AND p.user_id <> m.sender_id
+        WHERE m.created_at > COALESCE(p.last_read_at, '-infinity')
+        GROUP BY p.user_id, m.room_id
+    ) c;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION chat_unread_on_delete()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM chat_unread_apply(c.user_id, c.room_id, -c.delta::INTEGER)
+    FROM (
+        SELECT p.user_id, m.room_id, COUNT(*) AS delta
+        FROM old_messages m
+        JOIN chat_participants p ON p.room_id = m.room_id AND p.user_id <> m.sender_id
+        WHERE m.created_at > COALESCE(p.last_read_at, '-infinity')
+        GROUP BY p.user_id, m.room_id
+    ) c;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION chat_unread_on_join()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- A new member starts with the room's existing messages unread
+    INSERT INTO chat_unread_counters (user_id, room_id, unread_count)
+    SELECT p.user_id, p.room_id, COUNT(m.id)
+    FROM new_participants p
+    LEFT JOIN messages m
+        ON m.room_id = p.room_id
+       AND m.sender_id <> p.user_id
+       AND m.created_at > COALESCE(p.last_read_at, '-infinity')
+    GROUP BY p.user_id, p.room_id
+    ON CONFLICT (user_id, room_id) DO UPDATE
+        SET unread_count = EXCLUDED.unread_count,
+            updated_at = NOW();
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION chat_unread_on_leave()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM chat_unread_counters c
+    USING old_participants p
+    WHERE c.user_id = p.user_id AND c.room_id = p.room_id;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS messages_unread_insert ON messages;
+CREATE TRIGGER messages_unread_insert
+    AFTER INSERT ON messages
+    REFERENCING NEW TABLE AS new_messages
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION chat_unread_on_insert();
+
+-- Counts no longer follow messages.is_read
+DROP TRIGGER IF EXISTS messages_unread_update ON messages;
+DROP FUNCTION IF EXISTS chat_unread_on_update();
+
+DROP TRIGGER IF EXISTS messages_unread_delete ON messages;
+CREATE TRIGGER messages_unread_delete
+    AFTER DELETE ON messages
+    REFERENCING OLD TABLE AS old_messages
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION chat_unread_on_delete();
+
+DROP TRIGGER IF EXISTS chat_participants_unread_delete ON chat_participants;
+CREATE TRIGGER chat_participants_unread_delete
+    AFTER DELETE ON chat_participants
+    REFERENCING OLD TABLE AS old_participants
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION chat_unread_on_leave();
+
+DROP TRIGGER IF EXISTS chat_participants_unread_insert ON chat_participants;
+CREATE TRIGGER chat_participants_unread_insert
+    AFTER INSERT ON chat_participants
+    REFERENCING NEW TABLE AS new_participants
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION chat_unread_on_join();
+
+-- Existing members start from the old shared flag: read up to just before
+-- their oldest message still marked unread, or everything if there is none
+UPDATE chat_participants p
+SET last_read_at = COALESCE(
+    (
+        SELECT MIN(m.created_at) - INTERVAL '1 microsecond'
+        FROM messages m
+        WHERE m.room_id = p.room_id AND m.sender_id <> p.user_id AND m.is_read IS NOT TRUE
+    ),
+    NOW()
+)
+WHERE p.last_read_at IS NULL;
+
+-- Backfill (or recompute) every member's count from the messages already stored
+INSERT INTO chat_unread_counters (user_id, room_id, unread_count)
+SELECT p.user_id, p.room_id, COUNT(m.id)
+FROM chat_participants p
+LEFT JOIN messages m
+    ON m.room_id = p.room_id
+   AND m.sender_id <> p.user_id
+   AND m.created_at > p.last_read_at
+GROUP BY p.user_id, p.room_id
+ON CONFLICT (user_id, room_id) DO UPDATE SET unread_count = EXCLUDED.unread_count, updated_at = NOW();
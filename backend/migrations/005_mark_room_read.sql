@@ -0,0 +1,77 @@
+-- Mark a room read for one user up to a watermark in one statement.
+-- Used by PUT /api/chat/rooms/{room_id}/read when a room is opened, instead
+-- of one PUT /messages/{id}/read per message. The watermark is a message id
+-- (that message and everything older) or a timestamp; with neither, the whole
+-- room is marked read.
+--
+-- Read state is per user: the reader's chat_participants.last_read_at moves
+-- forward (never back) and only the reader's chat_unread_counters row is
+-- recomputed. The shared messages.is_read flag is not touched, so one member
+-- opening a group room does not mark it read for the others.
+--
+-- A message id that is not in the room, or a user who is not a participant,
+-- raises no_data_found (P0002), which the API reports as 404.
+CREATE OR REPLACE FUNCTION mark_room_read(
+    p_room_id UUID,
+    p_user_id UUID,
+    p_message_id UUID DEFAULT NULL,
+    p_up_to TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS TABLE (marked_count INTEGER, read_up_to TIMESTAMPTZ)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_up_to TIMESTAMPTZ := p_up_to;
+    v_read_at TIMESTAMPTZ;
+    v_before INTEGER;
+    v_unread INTEGER;
+BEGIN
+    IF p_message_id IS NOT NULL THEN
+        SELECT created_at INTO v_up_to
+        FROM messages
+        WHERE id = p_message_id AND room_id = p_room_id;
+
+        IF v_up_to IS NULL THEN
+            RAISE EXCEPTION 'Message % not found in room %', p_message_id, p_room_id
+                USING ERRCODE = 'no_data_found';
+        END IF;
+    END IF;
+    v_up_to := COALESCE(v_up_to, NOW());
+
+    UPDATE chat_participants
+    SET last_read_at = GREATEST(COALESCE(last_read_at, v_up_to), v_up_to)
+    WHERE room_id = p_room_id AND user_id = p_user_id
+    RETURNING last_read_at INTO v_read_at;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'User % is not a participant of room %', p_user_id, p_room_id
+            USING ERRCODE = 'no_data_found';
+    END IF;
+
+    -- Lock the reader's counter before counting, so a message inserted
+    -- concurrently is either counted here or applied by its trigger after us
+    INSERT INTO chat_unread_counters (user_id, room_id)
+    VALUES (p_user_id, p_room_id)
+    ON CONFLICT (user_id, room_id) DO NOTHING;
+
+    SELECT unread_count INTO v_before
+    FROM chat_unread_counters
+    WHERE user_id = p_user_id AND room_id = p_room_id
+    FOR UPDATE;
+
+    SELECT COUNT(*)::INTEGER INTO v_unread
+    FROM messages
+    WHERE room_id = p_room_id
+      AND sender_id <> p_user_id
+      AND created_at > v_read_at;
+
+    UPDATE chat_unread_counters
+    SET unread_count = v_unread, updated_at = NOW()
+    WHERE user_id = p_user_id AND room_id = p_room_id;
+
+    RETURN QUERY SELECT GREATEST(v_before - v_unread, 0), v_read_at;
+END;
+$$;
+
+-- Replaced by the per-user watermark; counting uses idx_messages_room_created_at_id (003)
+DROP INDEX IF EXISTS idx_messages_room_unread;
@@ -0,0 +1,43 @@
+-- Indexed full-text search over chat messages, used by GET /api/chat/search
+-- instead of ILIKE '%q%' (which scans the whole table).
+--
+-- The 'simple' configuration lowercases without stemming or stop words, so
+-- names, product codes and mixed-language messages match as typed. Every
+-- word of the query must match as a prefix, so "sol pan" finds "solar
+-- panel" while the user is still typing.
+ALTER TABLE messages
+    ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (to_tsvector('simple', COALESCE(content, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_messages_search_vector ON messages USING GIN (search_vector);
+
+-- Results are ordered by (rank DESC, id DESC); p_after_rank/p_after_id are
+-- the last row of the previous page (the cursor).
+CREATE OR REPLACE FUNCTION search_messages(
+    p_query TEXT,
+    p_room_id UUID DEFAULT NULL,
+    p_sender_id UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT 50,
+    p_after_rank REAL DEFAULT NULL,
+    p_after_id UUID DEFAULT NULL
+)
+RETURNS TABLE (message JSONB, rank REAL)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH q AS (
+        SELECT to_tsquery('simple', string_agg(quote_literal(lexeme) || ':*', ' & ')) AS query
+        FROM unnest(tsvector_to_array(to_tsvector('simple', p_query))) AS lexeme
+    ), matches AS (
+        SELECT m.id, to_jsonb(m) - 'search_vector' AS message, ts_rank(m.search_vector, q.query) AS rank
+        FROM messages m, q
+        WHERE m.search_vector @@ q.query
+          AND (p_room_id IS NULL OR m.room_id = p_room_id)
+          AND (p_sender_id IS NULL OR m.sender_id = p_sender_id)
+    )
+    SELECT message, rank
+    FROM matches
+    WHERE p_after_rank IS NULL OR (rank, id) < (p_after_rank, p_after_id)
+    ORDER BY rank DESC, id DESC
+    LIMIT p_limit;
+$$;
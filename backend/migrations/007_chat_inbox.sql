@@ -0,0 +1,35 @@
+-- One-call inbox for GET /api/chat/user/{user_id}/inbox: every room the user
+-- belongs to with its last message, the user's unread count (from 004) and
+-- its participant count, most recently active first.
+CREATE OR REPLACE FUNCTION chat_inbox(p_user_id UUID, p_limit INTEGER DEFAULT 100)
+RETURNS TABLE (room JSONB, last_message JSONB, unread_count INTEGER, participant_count INTEGER)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        to_jsonb(r),
+        CASE WHEN lm.id IS NULL THEN NULL ELSE to_jsonb(lm) - 'search_vector' END,
+        COALESCE(u.unread_count, 0),
+        pc.participant_count
+    FROM chat_participants me
+    JOIN chat_rooms r ON r.id = me.room_id
+    LEFT JOIN LATERAL (
+        SELECT m.*
+        FROM messages m
+        WHERE m.room_id = r.id
+        ORDER BY m.created_at DESC, m.id DESC
+        LIMIT 1
+    ) lm ON TRUE
+    LEFT JOIN chat_unread_counters u ON u.user_id = p_user_id AND u.room_id = r.id
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*)::INTEGER AS participant_count
+        FROM chat_participants p
+        WHERE p.room_id = r.id
+    ) pc
+    WHERE me.user_id = p_user_id
+    ORDER BY COALESCE(lm.created_at, r.created_at) DESC
+    LIMIT p_limit;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_chat_participants_user_id ON chat_participants(user_id);
+CREATE INDEX IF NOT EXISTS idx_chat_participants_room_id ON chat_participants(room_id);
@@ -0,0 +1,52 @@
+-- Per-member task metrics for the department dashboard
+-- (GET /api/staff/performance, backend/staff_performance.py), in one grouped
+-- query over staff joined to staff_tasks. p_staff_ids restricts it to the
+-- members whose tasks changed, for incremental refreshes.
+--
+-- There is no completed_at column, so time to complete is measured from
+-- created_at to the last update of a completed task.
+CREATE OR REPLACE FUNCTION staff_performance(p_department TEXT DEFAULT NULL, p_staff_ids UUID[] DEFAULT NULL)
+RETURNS TABLE (
+    staff_id UUID,
+    user_id UUID,
+    department TEXT,
+    "position" TEXT,
+    total_tasks INTEGER,
+    completed_tasks INTEGER,
+    pending_tasks INTEGER,
+    in_progress_tasks INTEGER,
+    overdue_tasks INTEGER,
+    avg_completion_hours DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        s.id,
+        s.user_id,
+        s.department::TEXT,
+        s.position::TEXT,
+        COUNT(t.id)::INTEGER,
+        COUNT(t.id) FILTER (WHERE t.status = 'completed')::INTEGER,
+        COUNT(t.id) FILTER (WHERE t.status = 'pending')::INTEGER,
+        COUNT(t.id) FILTER (WHERE t.status = 'in_progress')::INTEGER,
+        COUNT(t.id) FILTER (
+            WHERE t.status <> 'completed' AND t.due_date IS NOT NULL AND t.due_date::TIMESTAMPTZ < NOW()
+        )::INTEGER,
+        (AVG(EXTRACT(EPOCH FROM (t.updated_at - t.created_at))) FILTER (WHERE t.status = 'completed') / 3600)::DOUBLE PRECISION
+    FROM staff s
+    LEFT JOIN staff_tasks t ON t.assigned_to = s.id
+    WHERE s.is_active IS NOT FALSE
+      AND (p_department IS NULL OR s.department = p_department)
+      AND (p_staff_ids IS NULL OR s.id = ANY(p_staff_ids))
+    GROUP BY s.id;
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_staff_department ON staff(department);
+
+-- Keep staff_tasks.updated_at current (set_updated_at() is from 002)
+DROP TRIGGER IF EXISTS staff_tasks_set_updated_at ON staff_tasks;
+CREATE TRIGGER staff_tasks_set_updated_at
+    BEFORE UPDATE ON staff_tasks
+    FOR EACH ROW
+    EXECUTE FUNCTION set_updated_at();
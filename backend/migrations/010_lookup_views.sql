@@ -0,0 +1,18 @@
+-- Distinct values for the filter dropdowns (backend/lookups.py), read as a
+-- handful of rows instead of one column of every row. The indexes let
+-- Postgres answer each DISTINCT from the index alone.
+CREATE OR REPLACE VIEW staff_departments AS
+    SELECT DISTINCT department AS value FROM staff WHERE department IS NOT NULL;
+
+CREATE OR REPLACE VIEW staff_positions AS
+    SELECT DISTINCT position AS value FROM staff WHERE position IS NOT NULL;
+
+CREATE OR REPLACE VIEW marketplace_design_categories AS
+    SELECT DISTINCT category AS value FROM marketplace_designs WHERE category IS NOT NULL;
+
+CREATE OR REPLACE VIEW service_categories AS
+    SELECT DISTINCT category AS value FROM services WHERE category IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_staff_position ON staff(position);
+CREATE INDEX IF NOT EXISTS idx_marketplace_designs_category ON marketplace_designs(category);
+CREATE INDEX IF NOT EXISTS idx_services_category ON services(category);
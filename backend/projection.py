@@ -0,0 +1,57 @@
+"""Column projection (``fields=``) for read endpoints.
+
+Read endpoints accept a comma-separated ``fields`` query parameter naming the
+response-model fields the client needs, e.g. ``?fields=id,title,price``. Only
+those columns are selected from PostgREST, so wide JSONB columns such as
+``specifications``/``images`` or ``metadata`` are not transferred or parsed for
+list views that never show them.
+
+Endpoints using this declare ``partial_model(Model)`` as their response model
+with ``response_model_exclude_unset=True``. Columns the handler selects for
+itself (the pagination keys) are dropped again by ``rows_response`` when the
+client did not ask for them, so projected responses contain exactly the
+requested fields.
+"""
+
+from functools import lru_cache
+from typing import Iterable, List, Optional, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, create_model
+
+
+@lru_cache(maxsize=None)
+def partial_model(model: Type[BaseModel]) -> Type[BaseModel]:
+    """Copy of a response model with every field optional, for projected rows"""
+    fields = {
+        name: (Optional[field.annotation], None)
+        for name, field in model.model_fields.items()
+    }
+    return create_model(f"Partial{model.__name__}", **fields)
+
+
+def requested_fields(fields: str) -> List[str]:
+    """Field names listed in a fields= parameter"""
+    return [name.strip() for name in fields.split(",") if name.strip()]
+
+
+def select_fields(fields: Optional[str], model: Type[BaseModel], always: Iterable[str] = ()) -> str:
+    """Validate a fields= parameter against a response model and build the select clause
+
+    Without ``fields`` every column of the response model is selected, never
+    ``*``, so rows can be returned without passing through the model.
+    ``always`` lists columns the handler itself needs (e.g. the pagination
+    keys), which are selected even when the client does not ask for them.
+    """
+    if not fields:
+        requested = list(model.model_fields)
+    else:
+        requested = requested_fields(fields)
+        unknown = [name for name in requested if name not in model.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    columns = list(dict.fromkeys([*requested, *always]))
+    if not columns:
+        raise HTTPException(status_code=400, detail="No fields requested")
+    return ",".join(columns)
@@ -0,0 +1,56 @@
+"""Fast JSON responses for trusted database rows.
+
+When a handler returns plain dicts, FastAPI validates every row against the
+route's ``response_model`` and then encodes the result, which is a large share
+of CPU for big list responses. Rows read from our own database already have
+the right shape, so list endpoints opt into :func:`rows_response`: it encodes
+the rows directly with orjson and skips re-validation. The ``response_model``
+stays on the route for the OpenAPI docs.
+
+Set ``STRICT_RESPONSE_VALIDATION=true`` (the default when ``DEBUG`` is on) to
+validate and serialize through the response model as before, so schema drift
+still shows up in development.
+"""
+
+import os
+from functools import lru_cache
+from typing import List, Optional, Type
+
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+from projection import partial_model, requested_fields
+
+STRICT_RESPONSE_VALIDATION = os.getenv(
+    "STRICT_RESPONSE_VALIDATION", os.getenv("DEBUG", "false")
+).strip().lower() in ("1", "true", "yes", "on")
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def rows_response(rows: List[dict], model: Type[BaseModel], response: Optional[Response] = None, fields: Optional[str] = None) -> Response:
+    """Encode rows as JSON without re-validating them (unless strict validation is on)
+
+    ``response`` is the handler's injected Response; headers set on it (such
+    as the pagination cursor) are carried over, since FastAPI does not merge
+    them into a Response returned by the handler. ``fields`` is the client's
+    fields= parameter: columns selected only for the handler (such as the
+    pagination keys, once the cursor is built) are dropped, and strict mode
+    validates against the partial model.
+    """
+    if fields:
+        requested = requested_fields(fields)
+        rows = [{name: row[name] for name in requested if name in row} for row in rows]
+
+    if STRICT_RESPONSE_VALIDATION:
+        adapter = _list_adapter(partial_model(model) if fields else model)
+        rows = adapter.dump_python(adapter.validate_python(rows), mode="json", exclude_unset=True)
+
+    fast_response = ORJSONResponse(rows)
+    if response is not None:
+        fast_response.headers.raw.extend(response.headers.raw)
+    return fast_response
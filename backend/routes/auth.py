@@ -1,20 +1,13 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.security import HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
 
-load_dotenv()
+from database import Database, get_db
+from security import CurrentUser, get_current_user, get_current_user_verified, revoke_token, security
 
 router = APIRouter()
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-)
-
 class LoginRequest(BaseModel):
     email: EmailStr
     password: str
@@ -33,11 +26,11 @@ class AuthResponse(BaseModel):
     user: dict
 
 @router.post("/login", response_model=AuthResponse)
-async def login(request: LoginRequest):
+async def login(request: LoginRequest, db: Database = Depends(get_db)):
     """Login user with email and password"""
     try:
         # Sign in with Supabase
-        response = supabase.auth.sign_in_with_password({
+        response = await db.run_sync(db.auth.sign_in_with_password, {
             "email": request.email,
             "password": request.password
         })
@@ -46,7 +39,7 @@ async def login(request: LoginRequest):
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
         # Get user profile
-        user_profile = supabase.table("users").select("*").eq("id", response.user.id).single().execute()
+        user_profile = await db.execute(db.table("users").select("*").eq("id", response.user.id).single())
         
         return AuthResponse(
             access_token=response.session.access_token,
@@ -64,11 +57,11 @@ async def login(request: LoginRequest):
         raise HTTPException(status_code=401, detail=str(e))
 
 @router.post("/register", response_model=AuthResponse)
-async def register(request: RegisterRequest):
+async def register(request: RegisterRequest, db: Database = Depends(get_db)):
     """Register new user"""
     try:
         # Sign up with Supabase
-        response = supabase.auth.sign_up({
+        response = await db.run_sync(db.auth.sign_up, {
             "email": request.email,
             "password": request.password
         })
@@ -77,13 +70,13 @@ async def register(request: RegisterRequest):
             raise HTTPException(status_code=400, detail="Registration failed")
         
         # Create user profile
-        user_profile = supabase.table("users").insert({
+        user_profile = await db.execute(db.table("users").insert({
             "id": response.user.id,
             "email": request.email,
             "name": request.name,
             "role": request.role,
             "staff_code": request.staff_code
-        }).execute()
+        }))
         
         return AuthResponse(
             access_token=response.session.access_token if response.session else "",
@@ -100,32 +93,29 @@ async def register(request: RegisterRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/logout")
-async def logout():
+async def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: CurrentUser = Depends(get_current_user_verified),
+    db: Database = Depends(get_db)
+):
     """Logout user"""
     try:
-        supabase.auth.sign_out()
+        # Revoke the caller's session; the shared auth client holds no user session
+        await db.run_sync(db.auth.admin.sign_out, credentials.credentials)
+        revoke_token(credentials.credentials, user.claims)
         return {"message": "Logged out successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/me")
-async def get_current_user():
+async def get_me(user: CurrentUser = Depends(get_current_user)):
     """Get current user info"""
-    try:
-        user = supabase.auth.get_user()
-        if not user:
-            raise HTTPException(status_code=401, detail="Not authenticated")
-        
-        # Get user profile
-        profile = supabase.table("users").select("*").eq("id", user.id).single().execute()
-        
-        return {
-            "id": user.id,
-            "email": user.email,
-            "name": profile.data.get("name", ""),
-            "role": profile.data.get("role", "customer"),
-            "avatar": profile.data.get("avatar"),
-            "staff_code": profile.data.get("staff_code")
-        }
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=str(e))
+    profile = user.profile or {}
+    return {
+        "id": user.id,
+        "email": user.email,
+        "name": profile.get("name", ""),
+        "role": profile.get("role", "customer"),
+        "avatar": profile.get("avatar"),
+        "staff_code": profile.get("staff_code")
+    }
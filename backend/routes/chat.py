@@ -1,49 +1,173 @@
-from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Depends, Query, WebSocket, WebSocketDisconnect, Response
+from postgrest.exceptions import APIError
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
-import json
+from datetime import datetime
+import asyncio
+import uuid
 
-load_dotenv()
+from database import Database, get_db
+from messaging.ably_publisher import AblyPublisher, room_channel, user_channel
+from messaging.connections import Connection
+from messaging.history import CHAT_CATCH_UP_LIMIT, RecentMessages, parse_timestamp
+from messaging.membership import RoomMembership
+from messaging.protocol import Item, negotiate
+from messaging.pubsub import Broker, InProcessBroker
+from messaging.writer import message_writer
+from pagination import KEYSET_COLUMNS, MAX_PAGE_SIZE, decode_cursor, page, paginate
+from projection import partial_model, select_fields
+from responses import rows_response
+from security import CurrentUser, get_current_user
 
 router = APIRouter()
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-)
-
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
+        # user_id -> {connection id -> connection}, one entry per open device
+        self.active_connections: Dict[str, Dict[str, Connection]] = {}
+        self.rooms = RoomMembership()
+        self.history = RecentMessages()
+        # Carries events to every worker; replaced in lifespan (see messaging/pubsub.py)
+        self.broker: Broker = InProcessBroker()
+        # Set when CHAT_DELIVERY=ably: events also go to Ably channels
+        self.publisher: Optional[AblyPublisher] = None
+        self._publishing: Optional[asyncio.Task] = None
+    
+    async def start(self, broker: Broker, publisher: Optional[AblyPublisher] = None):
+        self.broker = broker
+        await broker.start(self.deliver)
+        if publisher is not None:
+            self.publisher = publisher
+            self._publishing = asyncio.create_task(publisher.run())
+    
+    @property
+    def socket_delivery(self) -> bool:
+        """False once every client receives through Ably (CHAT_ABLY_SOCKET_DELIVERY=false)"""
+        return self.publisher is None or self.publisher.socket_delivery
+    
+    async def stop(self):
+        if self._publishing is not None:
+            self.publisher.close()
+            await self._publishing
+        await self.broker.close()
+    
+    async def connect(self, websocket: WebSocket, user_id: str) -> Connection:
+        protocol = negotiate(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=protocol.subprotocol)
+        connection = Connection(websocket, user_id, protocol)
+        connection.start()
+        self.active_connections.setdefault(user_id, {})[connection.id] = connection
+        return connection
     
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
+    def disconnect(self, connection: Connection):
+        connection.stop()
+        user_connections = self.active_connections.get(connection.user_id)
+        if user_connections is not None:
+            user_connections.pop(connection.id, None)
+            if not user_connections:
+                del self.active_connections[connection.user_id]
     
-    def disconnect(self, user_id: str):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
+    async def send_personal_message(self, event: Dict[str, Any], user_id: str):
+        if self.publisher is not None:
+            self.publisher.publish(user_channel(user_id), event["type"], event)
+        if self.socket_delivery:
+            await self.broker.publish({"recipients": [user_id], "exclude": None, "event": event})
     
-    async def send_personal_message(self, message: str, user_id: str):
-        if user_id in self.active_connections:
-            await self.active_connections[user_id].send_text(message)
+    async def send_to_room(self, event: Dict[str, Any], room_id: str, db: Database):
+        if self.publisher is not None:
+            self.publisher.publish(room_channel(room_id), event["type"], event)
+        if not self.socket_delivery:
+            return
+        
+        # Get room participants (cached, see messaging/membership.py)
+        participants = await self.rooms.members(room_id, db)
+        
+        # Every worker, this one included, delivers to its own sockets
+        await self.broker.publish({"recipients": list(participants), "exclude": None, "event": event})
+    
+    async def broadcast_message(self, row: Dict[str, Any], db: Database, origin: Optional[Connection] = None):
+        """Send a new chat message to its room and add it to every worker's recent history
+
+        Every device of every participant receives it, the sender's included,
+        except ``origin``, the socket it was sent from.
+        """
+        if self.publisher is not None:
+            self.publisher.publish(room_channel(row["room_id"]), "message", row)
+        if not self.socket_delivery:
+            # Workers only need the row for their recent history
+            await self.broker.publish({"recipients": [], "exclude": None, "room_id": row["room_id"], "row": row})
+            return
+        
+        # Sockets still connected to the API get it too (clients not yet on Ably)
+        participants = await self.rooms.members(row["room_id"], db)
+        exclude = origin.id if origin is not None else None
+        await self.broker.publish({"recipients": list(participants), "exclude": exclude, "room_id": row["room_id"], "row": row})
     
-    async def send_to_room(self, message: str, room_id: str, sender_id: str):
-        # Get room participants
-        participants = supabase.table("chat_participants").select("user_id").eq("room_id", room_id).execute()
+    def deliver(self, event: Dict[str, Any]):
+        """Hand a published event to the recipients connected to this worker"""
+        row = event.get("row")
+        if row is not None:
+            self.history.append(event["room_id"], row)
+        exclude = event.get("exclude")
+        
+        # Encoded once per wire format, shared by every connection using it
+        encoded: Dict[str, Item] = {}
         
-        for participant in participants.data:
-            user_id = participant["user_id"]
-            if user_id != sender_id and user_id in self.active_connections:
-                await self.active_connections[user_id].send_text(message)
+        # Non-blocking enqueues; each connection's writer task does the sending
+        for user_id in event["recipients"]:
+            if user_id in self.active_connections:
+                for connection in list(self.active_connections[user_id].values()):
+                    if connection.id == exclude:
+                        continue
+                    protocol = connection.protocol
+                    item = encoded.get(protocol.name)
+                    if item is None:
+                        item = protocol.encode_message(row) if row is not None else protocol.encode_event(event["event"])
+                        encoded[protocol.name] = item
+                    connection.send(item)
+    
+    def stats(self) -> Dict[str, Any]:
+        connections = [c for user_connections in self.active_connections.values() for c in user_connections.values()]
+        memory = sum(connection.memory_usage() for connection in connections)
+        return {
+            "users": len(self.active_connections),
+            "connections": len(connections),
+            "queued_messages": sum(connection.queue.qsize() for connection in connections),
+            "dropped_messages": sum(connection.dropped for connection in connections),
+            "memory_bytes": memory,
+            "memory_bytes_per_connection": memory / len(connections) if connections else 0
+        }
 
 manager = ConnectionManager()
 
+async def check_message_target(room_id: str, sender_id: str, db: Database):
+    """Reject messages the database would refuse before write-behind mode queues them
+
+    In write-behind mode the insert happens after the sender has its answer,
+    so ids are checked up front: both must be uuids and the sender must be a
+    participant of the room. Otherwise the insert itself does the checking.
+    """
+    if not message_writer.enabled:
+        return
+    try:
+        uuid.UUID(room_id)
+        uuid.UUID(sender_id)
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid room_id or sender_id")
+    if sender_id not in await manager.rooms.members(room_id, db):
+        raise HTTPException(status_code=403, detail="Sender is not a participant of this room")
+
+async def save_message(row: Dict[str, Any], db: Database) -> Dict[str, Any]:
+    """Persist a new message, or queue it for a batched write in write-behind mode"""
+    if message_writer.enabled:
+        return message_writer.write(row)
+    query = db.table("messages").insert(row)
+    # Return the API columns only, not internal ones such as search_vector
+    query.params = query.params.add("select", select_fields(None, MessageResponse))
+    response = await db.execute(query)
+    return response.data[0]
+
 class MessageCreate(BaseModel):
     room_id: str
     sender_id: str
@@ -83,64 +207,134 @@ class ParticipantResponse(BaseModel):
     role: str
     joined_at: str
 
+class UnreadCountResponse(BaseModel):
+    room_id: str
+    unread_count: int
+
+class InboxEntryResponse(BaseModel):
+    room: RoomResponse
+    last_message: Optional[MessageResponse]
+    unread_count: int
+    participant_count: int
+
+async def send_missed_messages(connection: Connection, since: datetime, db: Database):
+    """Replay messages a reconnecting client missed, from recent history where it reaches back far enough"""
+    participant_rooms = await db.execute(db.table("chat_participants").select("room_id").eq("user_id", connection.user_id))
+    
+    missed = []
+    uncovered = []
+    for participant in participant_rooms.data:
+        rows = manager.history.since(participant["room_id"], since)
+        if rows is None:
+            uncovered.append(participant["room_id"])
+        else:
+            missed.extend(rows)
+    
+    if uncovered:
+        response = await db.execute(
+            db.table("messages").select(select_fields(None, MessageResponse))
+            .in_("room_id", uncovered).gt("created_at", since.isoformat())
+            .order("created_at").limit(CHAT_CATCH_UP_LIMIT)
+        )
+        missed.extend(response.data)
+    
+    # Including the user's own messages, which may have been sent from another device
+    missed.sort(key=lambda row: parse_timestamp(row["created_at"]))
+    for row in missed:
+        connection.send(connection.protocol.encode_message(row))
+
 @router.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
+async def websocket_endpoint(websocket: WebSocket, user_id: str, since: Optional[str] = None, db: Database = Depends(get_db)):
     """WebSocket endpoint for real-time messaging"""
-    await manager.connect(websocket, user_id)
     try:
+        catch_up_since = parse_timestamp(since) if since else None
+    except ValueError:
+        await websocket.close(code=1008)
+        return
+    
+    connection = await manager.connect(websocket, user_id)
+    try:
+        if catch_up_since:
+            await send_missed_messages(connection, catch_up_since, db)
+        
         while True:
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            message_data = connection.protocol.decode(message.get("text") or message.get("bytes"))
+            
+            try:
+                await check_message_target(message_data["room_id"], user_id, db)
+            except HTTPException as e:
+                connection.send(connection.protocol.encode_event({"type": "error", "room_id": message_data["room_id"], "detail": e.detail}))
+                continue
             
             # Save message to database
-            message_response = supabase.table("messages").insert({
+            saved = await save_message({
                 "room_id": message_data["room_id"],
                 "sender_id": user_id,
                 "message_type": message_data.get("message_type", "text"),
                 "content": message_data["content"],
                 "attachments": message_data.get("attachments", []),
                 "is_read": False
-            }).execute()
+            }, db)
             
             # Send to room participants
-            await manager.send_to_room(
-                json.dumps(message_response.data[0]),
-                message_data["room_id"],
-                user_id
-            )
+            await manager.broadcast_message(saved, db, origin=connection)
             
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        pass
+    finally:
+        manager.disconnect(connection)
+
+@router.get("/ably-token")
+async def get_ably_token(user: CurrentUser = Depends(get_current_user), db: Database = Depends(get_db)):
+    """Ably token request for the caller's own chat channels (CHAT_DELIVERY=ably)"""
+    if manager.publisher is None:
+        raise HTTPException(status_code=404, detail="Chat is not delivered through Ably")
+    try:
+        participant_rooms = await db.execute(db.table("chat_participants").select("room_id").eq("user_id", user.id))
+        return await manager.publisher.token_request(user.id, [p["room_id"] for p in participant_rooms.data])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/rooms/", response_model=List[RoomResponse])
-async def get_rooms(user_id: Optional[str] = None, room_type: Optional[str] = None, limit: int = 50, offset: int = 0):
+@router.get("/ws/stats")
+async def get_connection_stats():
+    """Get WebSocket connection counts and memory use for this worker"""
+    return manager.stats()
+
+@router.get("/rooms/", response_model=List[partial_model(RoomResponse)], response_model_exclude_unset=True)
+async def get_rooms(http_response: Response, user_id: Optional[str] = None, room_type: Optional[str] = None, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0), cursor: Optional[str] = None, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get chat rooms"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, RoomResponse, KEYSET_COLUMNS)
     try:
         if user_id:
             # Get rooms where user is a participant
-            participant_rooms = supabase.table("chat_participants").select("room_id").eq("user_id", user_id).execute()
+            participant_rooms = await db.execute(db.table("chat_participants").select("room_id").eq("user_id", user_id))
             room_ids = [p["room_id"] for p in participant_rooms.data]
             
             if not room_ids:
                 return []
             
-            query = supabase.table("chat_rooms").select("*").in_("id", room_ids)
+            query = db.table("chat_rooms").select(select).in_("id", room_ids)
         else:
-            query = supabase.table("chat_rooms").select("*")
+            query = db.table("chat_rooms").select(select)
         
         if room_type:
             query = query.eq("type", room_type)
         
-        response = query.range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(query, limit, offset, keyset))
+        return rows_response(page(response.data, limit, http_response), RoomResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/rooms/{room_id}", response_model=RoomResponse)
-async def get_room(room_id: str):
+@router.get("/rooms/{room_id}", response_model=partial_model(RoomResponse), response_model_exclude_unset=True)
+async def get_room(room_id: str, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get room by ID"""
+    select = select_fields(fields, RoomResponse)
     try:
-        response = supabase.table("chat_rooms").select("*").eq("id", room_id).single().execute()
+        response = await db.execute(db.table("chat_rooms").select(select).eq("id", room_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Room not found")
@@ -150,15 +344,15 @@ async def get_room(room_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/rooms/", response_model=RoomResponse)
-async def create_room(room: RoomCreate):
+async def create_room(room: RoomCreate, db: Database = Depends(get_db)):
     """Create new chat room"""
     try:
         # Create room
-        room_response = supabase.table("chat_rooms").insert({
+        room_response = await db.execute(db.table("chat_rooms").insert({
             "name": room.name,
             "type": room.type,
             "created_by": room.created_by
-        }).execute()
+        }))
         
         room_id = room_response.data[0]["id"]
         
@@ -171,70 +365,99 @@ async def create_room(room: RoomCreate):
                 "role": "admin" if participant_id == room.created_by else "member"
             })
         
-        supabase.table("chat_participants").insert(participants_data).execute()
+        await db.execute(db.table("chat_participants").insert(participants_data))
+        manager.rooms.set(room_id, room.participants)
         
         return room_response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/rooms/{room_id}")
-async def delete_room(room_id: str):
+async def delete_room(room_id: str, db: Database = Depends(get_db)):
     """Delete chat room"""
     try:
         # Delete participants
-        supabase.table("chat_participants").delete().eq("room_id", room_id).execute()
+        await db.execute(db.table("chat_participants").delete().eq("room_id", room_id))
         
         # Delete messages
-        supabase.table("messages").delete().eq("room_id", room_id).execute()
+        await db.execute(db.table("messages").delete().eq("room_id", room_id))
         
         # Delete room
-        response = supabase.table("chat_rooms").delete().eq("id", room_id).execute()
+        response = await db.execute(db.table("chat_rooms").delete().eq("id", room_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Room not found")
         
+        manager.rooms.drop(room_id)
+        manager.history.drop(room_id)
         return {"message": "Room deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/rooms/{room_id}/messages", response_model=List[MessageResponse])
-async def get_room_messages(room_id: str, limit: int = 50, offset: int = 0):
+async def fetch_recent_messages(room_id: str, count: int, db: Database) -> List[Dict[str, Any]]:
+    """The ``count`` newest messages of a room, newest first, for its history buffer"""
+    # Write-behind messages were broadcast before this load started and are
+    # not in the table yet; write them first so the snapshot includes them
+    if message_writer.enabled:
+        await message_writer.flush(db)
+    
+    query = db.table("messages").select(select_fields(None, MessageResponse)).eq("room_id", room_id)
+    query.params = query.params.add("order", "created_at.desc,id.desc")
+    response = await db.execute(query.limit(count))
+    return response.data
+
+@router.get("/rooms/{room_id}/messages", response_model=List[partial_model(MessageResponse)], response_model_exclude_unset=True)
+async def get_room_messages(http_response: Response, room_id: str, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0), cursor: Optional[str] = None, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get messages in a room"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, MessageResponse, KEYSET_COLUMNS)
     try:
-        response = supabase.table("messages").select("*").eq("room_id", room_id).range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        rows = None
+        if not (keyset or offset or limit >= manager.history.size):
+            # Newest page: served from the room's recent history (plus one look-ahead row)
+            rows = manager.history.latest(room_id, limit + 1)
+            if rows is None:
+                await manager.history.ensure_loaded(room_id, lambda count: fetch_recent_messages(room_id, count, db))
+                rows = manager.history.latest(room_id, limit + 1)
+        
+        if rows is None:
+            response = await db.execute(paginate(db.table("messages").select(select).eq("room_id", room_id), limit, offset, keyset))
+            rows = response.data
+        elif fields:
+            columns = select.split(",")
+            rows = [{column: row[column] for column in columns} for row in rows]
+        
+        return rows_response(page(rows, limit, http_response), MessageResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/messages/", response_model=MessageResponse)
-async def send_message(message: MessageCreate):
+async def send_message(message: MessageCreate, db: Database = Depends(get_db)):
     """Send a message"""
+    await check_message_target(message.room_id, message.sender_id, db)
     try:
-        response = supabase.table("messages").insert({
+        saved = await save_message({
             "room_id": message.room_id,
             "sender_id": message.sender_id,
             "message_type": message.message_type,
             "content": message.content,
             "attachments": message.attachments,
             "is_read": False
-        }).execute()
+        }, db)
         
         # Send to WebSocket connections
-        await manager.send_to_room(
-            json.dumps(response.data[0]),
-            message.room_id,
-            message.sender_id
-        )
+        await manager.broadcast_message(saved, db)
         
-        return response.data[0]
+        return saved
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/messages/{message_id}", response_model=MessageResponse)
-async def get_message(message_id: str):
+@router.get("/messages/{message_id}", response_model=partial_model(MessageResponse), response_model_exclude_unset=True)
+async def get_message(message_id: str, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get message by ID"""
+    select = select_fields(fields, MessageResponse)
     try:
-        response = supabase.table("messages").select("*").eq("id", message_id).single().execute()
+        response = await db.execute(db.table("messages").select(select).eq("id", message_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Message not found")
@@ -244,114 +467,189 @@ async def get_message(message_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/messages/{message_id}")
-async def update_message(message_id: str, content: str):
+async def update_message(message_id: str, content: str, db: Database = Depends(get_db)):
     """Update message content"""
     try:
-        response = supabase.table("messages").update({
+        response = await db.execute(db.table("messages").update({
             "content": content
-        }).eq("id", message_id).execute()
+        }).eq("id", message_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Message not found")
         
+        manager.history.drop(response.data[0]["room_id"])
         return {"message": "Message updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/messages/{message_id}")
-async def delete_message(message_id: str):
+async def delete_message(message_id: str, db: Database = Depends(get_db)):
     """Delete message"""
     try:
-        response = supabase.table("messages").delete().eq("id", message_id).execute()
+        response = await db.execute(db.table("messages").delete().eq("id", message_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Message not found")
         
+        manager.history.drop(response.data[0]["room_id"])
         return {"message": "Message deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/messages/{message_id}/read")
-async def mark_message_read(message_id: str):
+async def mark_message_read(message_id: str, db: Database = Depends(get_db)):
     """Mark message as read"""
     try:
-        response = supabase.table("messages").update({
+        response = await db.execute(db.table("messages").update({
             "is_read": True
-        }).eq("id", message_id).execute()
+        }).eq("id", message_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Message not found")
         
+        manager.history.drop(response.data[0]["room_id"])
         return {"message": "Message marked as read"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.put("/rooms/{room_id}/read")
+async def mark_room_read(room_id: str, user_id: str, message_id: Optional[str] = None, up_to: Optional[str] = None, db: Database = Depends(get_db)):
+    """Mark a room read for a user up to a message or timestamp (default: all)"""
+    try:
+        for value in (room_id, user_id, message_id):
+            if value is not None:
+                uuid.UUID(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid room_id, user_id or message_id")
+    if up_to is not None:
+        try:
+            up_to = parse_timestamp(up_to).isoformat()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid up_to timestamp")
+    
+    try:
+        # Messages still waiting in write-behind mode must exist before they can be marked
+        if message_writer.enabled:
+            await message_writer.flush(db)
+        
+        response = await db.execute(db.rpc("mark_room_read", {
+            "p_room_id": room_id,
+            "p_user_id": user_id,
+            "p_message_id": message_id,
+            "p_up_to": up_to
+        }))
+        result = response.data[0]
+        
+        # Read receipt for the other participants and the reader's other devices
+        await manager.send_to_room(
+            {
+                "type": "read_receipt",
+                "room_id": room_id,
+                "user_id": user_id,
+                "message_id": message_id,
+                "read_up_to": result["read_up_to"]
+            },
+            room_id,
+            db
+        )
+        
+        return {"message": "Room marked as read", "marked_count": result["marked_count"], "read_up_to": result["read_up_to"]}
+    except APIError as e:
+        # Raised by mark_room_read for a message outside the room or a non-participant
+        if e.code == "P0002":
+            raise HTTPException(status_code=404, detail=e.message)
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/rooms/{room_id}/participants", response_model=List[ParticipantResponse])
-async def get_room_participants(room_id: str):
+async def get_room_participants(room_id: str, db: Database = Depends(get_db)):
     """Get room participants"""
     try:
-        response = supabase.table("chat_participants").select("*").eq("room_id", room_id).execute()
+        response = await db.execute(db.table("chat_participants").select("*").eq("room_id", room_id))
         return response.data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/rooms/{room_id}/participants")
-async def add_participant(room_id: str, user_id: str, role: str = "member"):
+async def add_participant(room_id: str, user_id: str, role: str = "member", db: Database = Depends(get_db)):
     """Add participant to room"""
     try:
-        response = supabase.table("chat_participants").insert({
+        response = await db.execute(db.table("chat_participants").insert({
             "room_id": room_id,
             "user_id": user_id,
             "role": role
-        }).execute()
+        }))
         
+        manager.rooms.add(room_id, user_id)
         return {"message": "Participant added successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/rooms/{room_id}/participants/{user_id}")
-async def remove_participant(room_id: str, user_id: str):
+async def remove_participant(room_id: str, user_id: str, db: Database = Depends(get_db)):
     """Remove participant from room"""
     try:
-        response = supabase.table("chat_participants").delete().eq("room_id", room_id).eq("user_id", user_id).execute()
+        response = await db.execute(db.table("chat_participants").delete().eq("room_id", room_id).eq("user_id", user_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Participant not found")
         
+        manager.rooms.remove(room_id, user_id)
         return {"message": "Participant removed successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/user/{user_id}/unread-count")
-async def get_unread_count(user_id: str):
+async def get_unread_count(user_id: str, db: Database = Depends(get_db)):
     """Get user's unread message count"""
     try:
-        # Get user's rooms
-        participant_rooms = supabase.table("chat_participants").select("room_id").eq("user_id", user_id).execute()
-        room_ids = [p["room_id"] for p in participant_rooms.data]
-        
-        if not room_ids:
-            return {"unread_count": 0}
+        # Counters are maintained by triggers (migrations/004_chat_unread_counters.sql)
+        counters = await db.execute(db.table("chat_unread_counters").select("unread_count").eq("user_id", user_id).gt("unread_count", 0))
         
-        # Get unread messages count
-        unread_messages = supabase.table("messages").select("id").in_("room_id", room_ids).eq("is_read", False).neq("sender_id", user_id).execute()
-        
-        return {"unread_count": len(unread_messages.data)}
+        return {"unread_count": sum(c["unread_count"] for c in counters.data)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/user/{user_id}/inbox", response_model=List[InboxEntryResponse])
+async def get_inbox(user_id: str, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), db: Database = Depends(get_db)):
+    """Get user's rooms with last message, unread count and participant count"""
+    try:
+        # Single query (migrations/007_chat_inbox.sql), most recently active room first
+        response = await db.execute(db.rpc("chat_inbox", {"p_user_id": user_id, "p_limit": limit}))
+        return response.data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/search")
-async def search_messages(query: str, room_id: Optional[str] = None, user_id: Optional[str] = None, limit: int = 50):
+@router.get("/user/{user_id}/unread-counts", response_model=List[UnreadCountResponse])
+async def get_unread_counts(user_id: str, db: Database = Depends(get_db)):
+    """Get user's unread message count per room"""
+    try:
+        counters = await db.execute(db.table("chat_unread_counters").select("room_id,unread_count").eq("user_id", user_id).gt("unread_count", 0))
+        return counters.data
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class SearchResultResponse(MessageResponse):
+    rank: float
+
+@router.get("/search", response_model=List[SearchResultResponse])
+async def search_messages(http_response: Response, query: str, room_id: Optional[str] = None, user_id: Optional[str] = None, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, db: Database = Depends(get_db)):
     """Search messages"""
+    keyset = decode_cursor(cursor, column="rank")
+    after_rank = float(keyset[0]) if keyset else None
     try:
-        search_query = supabase.table("messages").select("*").ilike("content", f"%{query}%")
-        
-        if room_id:
-            search_query = search_query.eq("room_id", room_id)
-        if user_id:
-            search_query = search_query.eq("sender_id", user_id)
+        # Full-text search ranked by relevance (migrations/006_message_search.sql)
+        response = await db.execute(db.rpc("search_messages", {
+            "p_query": query,
+            "p_room_id": room_id,
+            "p_sender_id": user_id,
+            "p_limit": limit + 1,
+            "p_after_rank": after_rank,
+            "p_after_id": keyset[1] if keyset else None
+        }))
         
-        response = search_query.limit(limit).order("created_at", desc=True).execute()
-        return response.data
+        results = [{**result["message"], "rank": result["rank"]} for result in response.data]
+        return rows_response(page(results, limit, http_response, column="rank"), SearchResultResponse, http_response)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,20 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
 
-load_dotenv()
+from database import Database, get_db
+from lookups import lookups
+from pagination import KEYSET_COLUMNS, MAX_PAGE_SIZE, decode_cursor, page, paginate
+from projection import partial_model, select_fields
+from responses import rows_response
 
 router = APIRouter()
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-)
-
 class DesignCreate(BaseModel):
     seller_id: str
     title: str
@@ -61,18 +56,24 @@ class PurchaseResponse(BaseModel):
     created_at: str
     updated_at: str
 
-@router.get("/designs", response_model=List[DesignResponse])
+@router.get("/designs", response_model=List[partial_model(DesignResponse)], response_model_exclude_unset=True)
 async def get_designs(
+    http_response: Response,
     category: Optional[str] = None,
     seller_id: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
-    limit: int = 50,
-    offset: int = 0
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Database = Depends(get_db)
 ):
     """Get marketplace designs with filtering"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, DesignResponse, KEYSET_COLUMNS)
     try:
-        query = supabase.table("marketplace_designs").select("*")
+        query = db.table("marketplace_designs").select(select)
         
         if category:
             query = query.eq("category", category)
@@ -83,16 +84,17 @@ async def get_designs(
         if max_price:
             query = query.lte("price", max_price)
         
-        response = query.eq("status", "active").range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(query.eq("status", "active"), limit, offset, keyset))
+        return rows_response(page(response.data, limit, http_response), DesignResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/designs/{design_id}", response_model=DesignResponse)
-async def get_design(design_id: str):
+@router.get("/designs/{design_id}", response_model=partial_model(DesignResponse), response_model_exclude_unset=True)
+async def get_design(design_id: str, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get design by ID"""
+    select = select_fields(fields, DesignResponse)
     try:
-        response = supabase.table("marketplace_designs").select("*").eq("id", design_id).single().execute()
+        response = await db.execute(db.table("marketplace_designs").select(select).eq("id", design_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Design not found")
@@ -102,10 +104,10 @@ async def get_design(design_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/designs", response_model=DesignResponse)
-async def create_design(design: DesignCreate):
+async def create_design(design: DesignCreate, db: Database = Depends(get_db)):
     """Create new marketplace design"""
     try:
-        response = supabase.table("marketplace_designs").insert({
+        response = await db.execute(db.table("marketplace_designs").insert({
             "seller_id": design.seller_id,
             "title": design.title,
             "description": design.description,
@@ -114,37 +116,39 @@ async def create_design(design: DesignCreate):
             "images": design.images,
             "specifications": design.specifications,
             "status": "active"
-        }).execute()
+        }))
         
+        lookups.invalidate("design_categories")
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/designs/{design_id}", response_model=DesignResponse)
-async def update_design(design_id: str, design: DesignCreate):
+async def update_design(design_id: str, design: DesignCreate, db: Database = Depends(get_db)):
     """Update marketplace design"""
     try:
-        response = supabase.table("marketplace_designs").update({
+        response = await db.execute(db.table("marketplace_designs").update({
             "title": design.title,
             "description": design.description,
             "price": design.price,
             "category": design.category,
             "images": design.images,
             "specifications": design.specifications
-        }).eq("id", design_id).execute()
+        }).eq("id", design_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Design not found")
         
+        lookups.invalidate("design_categories")
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/designs/{design_id}")
-async def delete_design(design_id: str):
+async def delete_design(design_id: str, db: Database = Depends(get_db)):
     """Delete marketplace design"""
     try:
-        response = supabase.table("marketplace_designs").update({"status": "deleted"}).eq("id", design_id).execute()
+        response = await db.execute(db.table("marketplace_designs").update({"status": "deleted"}).eq("id", design_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Design not found")
@@ -154,19 +158,20 @@ async def delete_design(design_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/sellers", response_model=List[SellerProfile])
-async def get_sellers(limit: int = 50, offset: int = 0):
+async def get_sellers(http_response: Response, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0), cursor: Optional[str] = None, db: Database = Depends(get_db)):
     """Get marketplace sellers"""
+    keyset = decode_cursor(cursor)
     try:
-        response = supabase.table("marketplace_sellers").select("*").range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(db.table("marketplace_sellers").select("*"), limit, offset, keyset))
+        return page(response.data, limit, http_response)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/sellers/{seller_id}", response_model=SellerProfile)
-async def get_seller(seller_id: str):
+async def get_seller(seller_id: str, db: Database = Depends(get_db)):
     """Get seller profile"""
     try:
-        response = supabase.table("marketplace_sellers").select("*").eq("user_id", seller_id).single().execute()
+        response = await db.execute(db.table("marketplace_sellers").select("*").eq("user_id", seller_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Seller not found")
@@ -176,27 +181,27 @@ async def get_seller(seller_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/sellers", response_model=SellerProfile)
-async def create_seller_profile(seller: SellerProfile):
+async def create_seller_profile(seller: SellerProfile, db: Database = Depends(get_db)):
     """Create seller profile"""
     try:
-        response = supabase.table("marketplace_sellers").insert({
+        response = await db.execute(db.table("marketplace_sellers").insert({
             "user_id": seller.user_id,
             "company_name": seller.company_name,
             "description": seller.description,
             "portfolio_url": seller.portfolio_url,
             "rating": seller.rating
-        }).execute()
+        }))
         
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/purchases", response_model=PurchaseResponse)
-async def create_purchase(purchase: PurchaseRequest):
+async def create_purchase(purchase: PurchaseRequest, db: Database = Depends(get_db)):
     """Create marketplace purchase"""
     try:
         # Get design details
-        design_response = supabase.table("marketplace_designs").select("*").eq("id", purchase.design_id).single().execute()
+        design_response = await db.execute(db.table("marketplace_designs").select("*").eq("id", purchase.design_id).single())
         
         if not design_response.data:
             raise HTTPException(status_code=404, detail="Design not found")
@@ -204,41 +209,48 @@ async def create_purchase(purchase: PurchaseRequest):
         design = design_response.data
         total_price = design["price"] * purchase.quantity
         
-        response = supabase.table("marketplace_purchases").insert({
+        response = await db.execute(db.table("marketplace_purchases").insert({
             "buyer_id": purchase.buyer_id,
             "design_id": purchase.design_id,
             "quantity": purchase.quantity,
             "total_price": total_price,
             "customizations": purchase.customizations,
             "status": "pending"
-        }).execute()
+        }))
         
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/purchases", response_model=List[PurchaseResponse])
-async def get_purchases(buyer_id: Optional[str] = None, seller_id: Optional[str] = None, limit: int = 50, offset: int = 0):
+@router.get("/purchases", response_model=List[partial_model(PurchaseResponse)], response_model_exclude_unset=True)
+async def get_purchases(http_response: Response, buyer_id: Optional[str] = None, seller_id: Optional[str] = None, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0), cursor: Optional[str] = None, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get marketplace purchases"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, PurchaseResponse, KEYSET_COLUMNS)
     try:
-        query = supabase.table("marketplace_purchases").select("*")
+        if seller_id:
+            # Join with designs to filter by seller
+            query = db.table("marketplace_purchases").select(f"{select},marketplace_designs!inner(seller_id)").eq("marketplace_designs.seller_id", seller_id)
+        else:
+            query = db.table("marketplace_purchases").select(select)
         
         if buyer_id:
             query = query.eq("buyer_id", buyer_id)
-        if seller_id:
-            # Join with designs to filter by seller
-            query = query.select("*, marketplace_designs!inner(seller_id)").eq("marketplace_designs.seller_id", seller_id)
         
-        response = query.range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(query, limit, offset, keyset))
+        rows = page(response.data, limit, http_response)
+        for row in rows:
+            row.pop("marketplace_designs", None)
+        return rows_response(rows, PurchaseResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/purchases/{purchase_id}", response_model=PurchaseResponse)
-async def get_purchase(purchase_id: str):
+@router.get("/purchases/{purchase_id}", response_model=partial_model(PurchaseResponse), response_model_exclude_unset=True)
+async def get_purchase(purchase_id: str, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get purchase by ID"""
+    select = select_fields(fields, PurchaseResponse)
     try:
-        response = supabase.table("marketplace_purchases").select("*").eq("id", purchase_id).single().execute()
+        response = await db.execute(db.table("marketplace_purchases").select(select).eq("id", purchase_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Purchase not found")
@@ -248,10 +260,10 @@ async def get_purchase(purchase_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/purchases/{purchase_id}/status")
-async def update_purchase_status(purchase_id: str, status: str):
+async def update_purchase_status(purchase_id: str, status: str, db: Database = Depends(get_db)):
     """Update purchase status"""
     try:
-        response = supabase.table("marketplace_purchases").update({"status": status}).eq("id", purchase_id).execute()
+        response = await db.execute(db.table("marketplace_purchases").update({"status": status}).eq("id", purchase_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Purchase not found")
@@ -261,11 +273,9 @@ async def update_purchase_status(purchase_id: str, status: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/categories")
-async def get_categories():
+async def get_categories(db: Database = Depends(get_db)):
     """Get available design categories"""
     try:
-        response = supabase.table("marketplace_designs").select("category").execute()
-        categories = list(set([item["category"] for item in response.data]))
-        return {"categories": categories}
+        return {"categories": await lookups.get("design_categories", db)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,20 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
 
-load_dotenv()
+from database import Database, get_db
 
 router = APIRouter()
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-)
-
 class OrderItem(BaseModel):
     product_id: str
     quantity: int
@@ -27,6 +18,14 @@ class Order(BaseModel):
     payment_method: str
     shipping_address: Dict[str, Any]
 
+class OrderItemResponse(BaseModel):
+    id: str
+    order_id: str
+    product_id: str
+    quantity: int
+    price: float
+    created_at: str
+
 class OrderResponse(BaseModel):
     id: str
     user_id: str
@@ -37,55 +36,56 @@ class OrderResponse(BaseModel):
     shipping_address: Dict[str, Any]
     created_at: str
     updated_at: str
+    order_items: Optional[List[OrderItemResponse]] = None
+
+def order_select(expand: Optional[str] = None) -> str:
+    """Select clause for orders; expand=items embeds order_items in the same query"""
+    if expand is None:
+        return "*"
+    if expand != "items":
+        raise HTTPException(status_code=400, detail="Unsupported expand value, expected 'items'")
+    return "*, order_items(*)"
 
-@router.post("/", response_model=OrderResponse)
-async def create_order(order: Order):
+@router.post("/", response_model=OrderResponse, response_model_exclude_unset=True)
+async def create_order(order: Order, db: Database = Depends(get_db)):
     """Create new order"""
     try:
-        # Create order
-        order_response = supabase.table("orders").insert({
-            "user_id": order.user_id,
-            "total": order.total,
-            "payment_method": order.payment_method,
-            "shipping_address": order.shipping_address,
-            "status": "pending",
-            "payment_status": "pending"
-        }).execute()
-        
-        order_id = order_response.data[0]["id"]
-        
-        # Create order items
-        for item in order.items:
-            supabase.table("order_items").insert({
-                "order_id": order_id,
-                "product_id": item.product_id,
-                "quantity": item.quantity,
-                "price": item.price
-            }).execute()
+        # Create order and items in one transaction (see migrations/001_create_order_with_items.sql)
+        order_response = await db.execute(db.rpc("create_order_with_items", {
+            "p_order": {
+                "user_id": order.user_id,
+                "total": order.total,
+                "payment_method": order.payment_method,
+                "shipping_address": order.shipping_address
+            },
+            "p_items": [item.dict() for item in order.items]
+        }))
         
         return order_response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=List[OrderResponse])
-async def get_orders(user_id: Optional[str] = None):
+@router.get("/", response_model=List[OrderResponse], response_model_exclude_unset=True)
+async def get_orders(user_id: Optional[str] = None, expand: Optional[str] = None, db: Database = Depends(get_db)):
     """Get all orders or user's orders"""
+    select = order_select(expand)
     try:
-        query = supabase.table("orders").select("*")
+        query = db.table("orders").select(select)
         
         if user_id:
             query = query.eq("user_id", user_id)
         
-        response = query.order("created_at", desc=True).execute()
+        response = await db.execute(query.order("created_at", desc=True))
         return response.data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/{order_id}", response_model=OrderResponse)
-async def get_order(order_id: str):
+@router.get("/{order_id}", response_model=OrderResponse, response_model_exclude_unset=True)
+async def get_order(order_id: str, expand: Optional[str] = None, db: Database = Depends(get_db)):
     """Get order by ID"""
+    select = order_select(expand)
     try:
-        response = supabase.table("orders").select("*").eq("id", order_id).single().execute()
+        response = await db.execute(db.table("orders").select(select).eq("id", order_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Order not found")
@@ -95,12 +95,12 @@ async def get_order(order_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/{order_id}/status")
-async def update_order_status(order_id: str, status: str):
+async def update_order_status(order_id: str, status: str, db: Database = Depends(get_db)):
     """Update order status"""
     try:
-        response = supabase.table("orders").update({
+        response = await db.execute(db.table("orders").update({
             "status": status
-        }).eq("id", order_id).execute()
+        }).eq("id", order_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Order not found")
@@ -110,10 +110,10 @@ async def update_order_status(order_id: str, status: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{order_id}/items")
-async def get_order_items(order_id: str):
+async def get_order_items(order_id: str, db: Database = Depends(get_db)):
     """Get order items"""
     try:
-        response = supabase.table("order_items").select("*").eq("order_id", order_id).execute()
+        response = await db.execute(db.table("order_items").select("*").eq("order_id", order_id))
         return response.data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
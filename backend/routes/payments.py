@@ -1,22 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
 import uuid
 import json
 
-load_dotenv()
+from database import Database, get_db
+from pagination import KEYSET_COLUMNS, MAX_PAGE_SIZE, decode_cursor, page, paginate
+from projection import partial_model, select_fields
+from responses import rows_response
+from security import get_current_user_verified
 
 router = APIRouter()
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-)
-
 class PaymentInitiate(BaseModel):
     user_id: str
     amount: float
@@ -58,14 +53,14 @@ class RefundResponse(BaseModel):
     created_at: str
     updated_at: str
 
-@router.post("/initiate", response_model=PaymentResponse)
-async def initiate_payment(payment: PaymentInitiate):
+@router.post("/initiate", response_model=PaymentResponse, dependencies=[Depends(get_current_user_verified)])
+async def initiate_payment(payment: PaymentInitiate, db: Database = Depends(get_db)):
     """Initialize payment"""
     try:
         # Generate payment intent ID (in real app, this would be from Stripe/PayPal)
         payment_intent_id = f"pi_{uuid.uuid4().hex[:24]}"
         
-        response = supabase.table("payments").insert({
+        response = await db.execute(db.table("payments").insert({
             "user_id": payment.user_id,
             "amount": payment.amount,
             "currency": payment.currency,
@@ -74,36 +69,36 @@ async def initiate_payment(payment: PaymentInitiate):
             "description": payment.description,
             "metadata": payment.metadata,
             "status": "pending"
-        }).execute()
+        }))
         
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/verify", response_model=PaymentResponse)
-async def verify_payment(payment_verify: PaymentVerify):
+@router.post("/verify", response_model=PaymentResponse, dependencies=[Depends(get_current_user_verified)])
+async def verify_payment(payment_verify: PaymentVerify, db: Database = Depends(get_db)):
     """Verify payment completion"""
     try:
-        response = supabase.table("payments").update({
+        response = await db.execute(db.table("payments").update({
             "status": payment_verify.status
-        }).eq("id", payment_verify.payment_id).execute()
+        }).eq("id", payment_verify.payment_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Payment not found")
         
         # If payment successful, update related orders/bookings
         if payment_verify.status == "completed":
-            await _handle_successful_payment(payment_verify.payment_id)
+            await _handle_successful_payment(db, payment_verify.payment_id)
         
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-async def _handle_successful_payment(payment_id: str):
+async def _handle_successful_payment(db: Database, payment_id: str):
     """Handle successful payment completion"""
     try:
         # Get payment details
-        payment_response = supabase.table("payments").select("*").eq("id", payment_id).single().execute()
+        payment_response = await db.execute(db.table("payments").select("*").eq("id", payment_id).single())
         
         if not payment_response.data:
             return
@@ -113,39 +108,45 @@ async def _handle_successful_payment(payment_id: str):
         
         # Update order status if this is an order payment
         if metadata.get("order_id"):
-            supabase.table("orders").update({
+            await db.execute(db.table("orders").update({
                 "payment_status": "completed",
                 "status": "confirmed"
-            }).eq("id", metadata["order_id"]).execute()
+            }).eq("id", metadata["order_id"]))
         
         # Update booking status if this is a booking payment
         if metadata.get("booking_id"):
-            supabase.table("bookings").update({
+            await db.execute(db.table("bookings").update({
                 "payment_status": "completed",
                 "status": "confirmed"
-            }).eq("id", metadata["booking_id"]).execute()
+            }).eq("id", metadata["booking_id"]))
         
         # Update marketplace purchase if this is a marketplace payment
         if metadata.get("purchase_id"):
-            supabase.table("marketplace_purchases").update({
+            await db.execute(db.table("marketplace_purchases").update({
                 "payment_status": "completed",
                 "status": "confirmed"
-            }).eq("id", metadata["purchase_id"]).execute()
+            }).eq("id", metadata["purchase_id"]))
         
     except Exception as e:
         print(f"Error handling successful payment: {e}")
 
-@router.get("/", response_model=List[PaymentResponse])
+@router.get("/", response_model=List[partial_model(PaymentResponse)], response_model_exclude_unset=True)
 async def get_payments(
+    http_response: Response,
     user_id: Optional[str] = None,
     status: Optional[str] = None,
     payment_method: Optional[str] = None,
-    limit: int = 50,
-    offset: int = 0
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Database = Depends(get_db)
 ):
     """Get payments with filtering"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, PaymentResponse, KEYSET_COLUMNS)
     try:
-        query = supabase.table("payments").select("*")
+        query = db.table("payments").select(select)
         
         if user_id:
             query = query.eq("user_id", user_id)
@@ -154,16 +155,17 @@ async def get_payments(
         if payment_method:
             query = query.eq("payment_method", payment_method)
         
-        response = query.range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(query, limit, offset, keyset))
+        return rows_response(page(response.data, limit, http_response), PaymentResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/{payment_id}", response_model=PaymentResponse)
-async def get_payment(payment_id: str):
+@router.get("/{payment_id}", response_model=partial_model(PaymentResponse), response_model_exclude_unset=True)
+async def get_payment(payment_id: str, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get payment by ID"""
+    select = select_fields(fields, PaymentResponse)
     try:
-        response = supabase.table("payments").select("*").eq("id", payment_id).single().execute()
+        response = await db.execute(db.table("payments").select(select).eq("id", payment_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Payment not found")
@@ -172,12 +174,12 @@ async def get_payment(payment_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/refund", response_model=RefundResponse)
-async def create_refund(refund: RefundRequest):
+@router.post("/refund", response_model=RefundResponse, dependencies=[Depends(get_current_user_verified)])
+async def create_refund(refund: RefundRequest, db: Database = Depends(get_db)):
     """Create payment refund"""
     try:
         # Get payment details
-        payment_response = supabase.table("payments").select("*").eq("id", refund.payment_id).single().execute()
+        payment_response = await db.execute(db.table("payments").select("*").eq("id", refund.payment_id).single())
         
         if not payment_response.data:
             raise HTTPException(status_code=404, detail="Payment not found")
@@ -190,46 +192,52 @@ async def create_refund(refund: RefundRequest):
         # Generate refund ID (in real app, this would be from payment processor)
         refund_id = f"re_{uuid.uuid4().hex[:24]}"
         
-        response = supabase.table("refunds").insert({
+        response = await db.execute(db.table("refunds").insert({
             "payment_id": refund.payment_id,
             "amount": refund_amount,
             "reason": refund.reason,
             "refund_id": refund_id,
             "status": "pending"
-        }).execute()
+        }))
         
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/refunds/", response_model=List[RefundResponse])
+@router.get("/refunds/", response_model=List[partial_model(RefundResponse)], response_model_exclude_unset=True)
 async def get_refunds(
+    http_response: Response,
     payment_id: Optional[str] = None,
     status: Optional[str] = None,
-    limit: int = 50,
-    offset: int = 0
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Database = Depends(get_db)
 ):
     """Get refunds with filtering"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, RefundResponse, KEYSET_COLUMNS)
     try:
-        query = supabase.table("refunds").select("*")
+        query = db.table("refunds").select(select)
         
         if payment_id:
             query = query.eq("payment_id", payment_id)
         if status:
             query = query.eq("status", status)
         
-        response = query.range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(query, limit, offset, keyset))
+        return rows_response(page(response.data, limit, http_response), RefundResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.put("/refunds/{refund_id}")
-async def update_refund_status(refund_id: str, status: str):
+@router.put("/refunds/{refund_id}", dependencies=[Depends(get_current_user_verified)])
+async def update_refund_status(refund_id: str, status: str, db: Database = Depends(get_db)):
     """Update refund status"""
     try:
-        response = supabase.table("refunds").update({
+        response = await db.execute(db.table("refunds").update({
             "status": status
-        }).eq("id", refund_id).execute()
+        }).eq("id", refund_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Refund not found")
@@ -239,7 +247,7 @@ async def update_refund_status(refund_id: str, status: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/webhook/stripe")
-async def stripe_webhook(request: Request):
+async def stripe_webhook(request: Request, db: Database = Depends(get_db)):
     """Handle Stripe webhook events"""
     try:
         payload = await request.body()
@@ -247,69 +255,69 @@ async def stripe_webhook(request: Request):
         
         # Handle different event types
         if event["type"] == "payment_intent.succeeded":
-            await _handle_payment_success(event["data"]["object"])
+            await _handle_payment_success(db, event["data"]["object"])
         elif event["type"] == "payment_intent.payment_failed":
-            await _handle_payment_failure(event["data"]["object"])
+            await _handle_payment_failure(db, event["data"]["object"])
         elif event["type"] == "charge.dispute.created":
-            await _handle_chargeback(event["data"]["object"])
+            await _handle_chargeback(db, event["data"]["object"])
         
         return {"status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-async def _handle_payment_success(payment_intent):
+async def _handle_payment_success(db: Database, payment_intent):
     """Handle successful payment from webhook"""
     try:
         # Update payment status
-        supabase.table("payments").update({
+        await db.execute(db.table("payments").update({
             "status": "completed"
-        }).eq("payment_intent_id", payment_intent["id"]).execute()
+        }).eq("payment_intent_id", payment_intent["id"]))
         
         # Get payment to handle completion
-        payment_response = supabase.table("payments").select("*").eq("payment_intent_id", payment_intent["id"]).single().execute()
+        payment_response = await db.execute(db.table("payments").select("*").eq("payment_intent_id", payment_intent["id"]).single())
         
         if payment_response.data:
-            await _handle_successful_payment(payment_response.data["id"])
+            await _handle_successful_payment(db, payment_response.data["id"])
         
     except Exception as e:
         print(f"Error handling payment success webhook: {e}")
 
-async def _handle_payment_failure(payment_intent):
+async def _handle_payment_failure(db: Database, payment_intent):
     """Handle failed payment from webhook"""
     try:
-        supabase.table("payments").update({
+        await db.execute(db.table("payments").update({
             "status": "failed"
-        }).eq("payment_intent_id", payment_intent["id"]).execute()
+        }).eq("payment_intent_id", payment_intent["id"]))
         
     except Exception as e:
         print(f"Error handling payment failure webhook: {e}")
 
-async def _handle_chargeback(charge):
+async def _handle_chargeback(db: Database, charge):
     """Handle chargeback from webhook"""
     try:
         # Create chargeback record
-        supabase.table("chargebacks").insert({
+        await db.execute(db.table("chargebacks").insert({
             "charge_id": charge["id"],
             "amount": charge["amount"],
             "reason": charge["dispute"]["reason"],
             "status": "open"
-        }).execute()
+        }))
         
     except Exception as e:
         print(f"Error handling chargeback webhook: {e}")
 
 @router.get("/stats/revenue")
-async def get_revenue_stats():
+async def get_revenue_stats(db: Database = Depends(get_db)):
     """Get revenue statistics"""
     try:
         # Get all successful payments
-        payments = supabase.table("payments").select("*").eq("status", "completed").execute()
+        payments = await db.execute(db.table("payments").select("*").eq("status", "completed"))
         
         total_revenue = sum([p["amount"] for p in payments.data])
         total_transactions = len(payments.data)
         
         # Get refunds
-        refunds = supabase.table("refunds").select("*").eq("status", "completed").execute()
+        refunds = await db.execute(db.table("refunds").select("*").eq("status", "completed"))
         total_refunds = sum([r["amount"] for r in refunds.data])
         
         net_revenue = total_revenue - total_refunds
@@ -336,11 +344,13 @@ async def get_payment_methods():
         ]
     }
 
-@router.get("/user/{user_id}/history", response_model=List[PaymentResponse])
-async def get_user_payment_history(user_id: str, limit: int = 50, offset: int = 0):
+@router.get("/user/{user_id}/history", response_model=List[partial_model(PaymentResponse)], response_model_exclude_unset=True)
+async def get_user_payment_history(http_response: Response, user_id: str, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0), cursor: Optional[str] = None, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get user's payment history"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, PaymentResponse, KEYSET_COLUMNS)
     try:
-        response = supabase.table("payments").select("*").eq("user_id", user_id).range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(db.table("payments").select(select).eq("user_id", user_id), limit, offset, keyset))
+        return rows_response(page(response.data, limit, http_response), PaymentResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
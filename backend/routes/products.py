@@ -1,20 +1,13 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import List, Optional
-import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
 
-load_dotenv()
+from catalog import catalog
+from database import Database, get_db
+from responses import rows_response
 
 router = APIRouter()
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-)
-
 class Product(BaseModel):
     id: Optional[str] = None
     name: str
@@ -36,87 +29,83 @@ class ProductResponse(BaseModel):
     updated_at: str
 
 @router.get("/", response_model=List[ProductResponse])
-async def get_products(category: Optional[str] = None):
+async def get_products(category: Optional[str] = None, db: Database = Depends(get_db)):
     """Get all products"""
     try:
-        query = supabase.table("products").select("*")
-        
-        if category:
-            query = query.eq("category", category)
-        
-        response = query.execute()
-        return response.data
+        return rows_response(await catalog.list(db, category), ProductResponse)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: str):
+async def get_product(product_id: str, db: Database = Depends(get_db)):
     """Get product by ID"""
     try:
-        response = supabase.table("products").select("*").eq("id", product_id).single().execute()
+        product = await catalog.get(db, product_id)
         
-        if not response.data:
+        if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         
-        return response.data
+        return product
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/", response_model=ProductResponse)
-async def create_product(product: Product):
+async def create_product(product: Product, db: Database = Depends(get_db)):
     """Create new product"""
     try:
-        response = supabase.table("products").insert({
+        response = await db.execute(db.table("products").insert({
             "name": product.name,
             "description": product.description,
             "price": product.price,
             "category": product.category,
             "image": product.image,
             "in_stock": product.in_stock
-        }).execute()
+        }))
         
+        catalog.upsert(response.data[0])
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/{product_id}", response_model=ProductResponse)
-async def update_product(product_id: str, product: Product):
+async def update_product(product_id: str, product: Product, db: Database = Depends(get_db)):
     """Update product"""
     try:
-        response = supabase.table("products").update({
+        response = await db.execute(db.table("products").update({
             "name": product.name,
             "description": product.description,
             "price": product.price,
             "category": product.category,
             "image": product.image,
             "in_stock": product.in_stock
-        }).eq("id", product_id).execute()
+        }).eq("id", product_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Product not found")
         
+        catalog.upsert(response.data[0])
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{product_id}")
-async def delete_product(product_id: str):
+async def delete_product(product_id: str, db: Database = Depends(get_db)):
     """Delete product"""
     try:
-        response = supabase.table("products").delete().eq("id", product_id).execute()
+        response = await db.execute(db.table("products").delete().eq("id", product_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Product not found")
         
+        catalog.remove(product_id)
         return {"message": "Product deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/category/{category}")
-async def get_products_by_category(category: str):
+async def get_products_by_category(category: str, db: Database = Depends(get_db)):
     """Get products by category"""
     try:
-        response = supabase.table("products").select("*").eq("category", category).execute()
-        return response.data
+        return rows_response(await catalog.list(db, category), ProductResponse)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
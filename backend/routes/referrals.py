@@ -1,22 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
 import random
 import string
 
-load_dotenv()
+from database import Database, get_db
+from pagination import KEYSET_COLUMNS, MAX_PAGE_SIZE, decode_cursor, page, paginate
+from projection import partial_model, select_fields
+from responses import rows_response
 
 router = APIRouter()
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-)
-
 class ReferralCreate(BaseModel):
     referrer_id: str
     referred_email: str
@@ -66,17 +60,23 @@ def generate_referral_code():
     """Generate a unique referral code"""
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
 
-@router.get("/", response_model=List[ReferralResponse])
+@router.get("/", response_model=List[partial_model(ReferralResponse)], response_model_exclude_unset=True)
 async def get_referrals(
+    http_response: Response,
     referrer_id: Optional[str] = None,
     status: Optional[str] = None,
     referral_type: Optional[str] = None,
-    limit: int = 50,
-    offset: int = 0
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Database = Depends(get_db)
 ):
     """Get referrals with filtering"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, ReferralResponse, KEYSET_COLUMNS)
     try:
-        query = supabase.table("referrals").select("*")
+        query = db.table("referrals").select(select)
         
         if referrer_id:
             query = query.eq("referrer_id", referrer_id)
@@ -85,16 +85,17 @@ async def get_referrals(
         if referral_type:
             query = query.eq("referral_type", referral_type)
         
-        response = query.range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(query, limit, offset, keyset))
+        return rows_response(page(response.data, limit, http_response), ReferralResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/{referral_id}", response_model=ReferralResponse)
-async def get_referral(referral_id: str):
+@router.get("/{referral_id}", response_model=partial_model(ReferralResponse), response_model_exclude_unset=True)
+async def get_referral(referral_id: str, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get referral by ID"""
+    select = select_fields(fields, ReferralResponse)
     try:
-        response = supabase.table("referrals").select("*").eq("id", referral_id).single().execute()
+        response = await db.execute(db.table("referrals").select(select).eq("id", referral_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Referral not found")
@@ -104,12 +105,12 @@ async def get_referral(referral_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/", response_model=ReferralResponse)
-async def create_referral(referral: ReferralCreate):
+async def create_referral(referral: ReferralCreate, db: Database = Depends(get_db)):
     """Create new referral"""
     try:
         referral_code = generate_referral_code()
         
-        response = supabase.table("referrals").insert({
+        response = await db.execute(db.table("referrals").insert({
             "referrer_id": referral.referrer_id,
             "referred_email": referral.referred_email,
             "referral_code": referral_code,
@@ -117,20 +118,20 @@ async def create_referral(referral: ReferralCreate):
             "commission_rate": referral.commission_rate,
             "status": "pending",
             "commission_earned": 0
-        }).execute()
+        }))
         
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/{referral_id}/approve")
-async def approve_referral(referral_id: str, referred_user_id: str):
+async def approve_referral(referral_id: str, referred_user_id: str, db: Database = Depends(get_db)):
     """Approve referral when referred user signs up"""
     try:
-        response = supabase.table("referrals").update({
+        response = await db.execute(db.table("referrals").update({
             "referred_user_id": referred_user_id,
             "status": "active"
-        }).eq("id", referral_id).execute()
+        }).eq("id", referral_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Referral not found")
@@ -140,11 +141,11 @@ async def approve_referral(referral_id: str, referred_user_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/{referral_id}/complete")
-async def complete_referral(referral_id: str, commission_amount: float):
+async def complete_referral(referral_id: str, commission_amount: float, db: Database = Depends(get_db)):
     """Complete referral and calculate commission"""
     try:
         # Get referral details
-        referral_response = supabase.table("referrals").select("*").eq("id", referral_id).single().execute()
+        referral_response = await db.execute(db.table("referrals").select("*").eq("id", referral_id).single())
         
         if not referral_response.data:
             raise HTTPException(status_code=404, detail="Referral not found")
@@ -153,36 +154,42 @@ async def complete_referral(referral_id: str, commission_amount: float):
         earned_commission = commission_amount * (referral["commission_rate"] / 100)
         
         # Update referral
-        supabase.table("referrals").update({
+        await db.execute(db.table("referrals").update({
             "status": "completed",
             "commission_earned": earned_commission
-        }).eq("id", referral_id).execute()
+        }).eq("id", referral_id))
         
         # Create earning record
-        supabase.table("referral_earnings").insert({
+        await db.execute(db.table("referral_earnings").insert({
             "user_id": referral["referrer_id"],
             "referral_id": referral_id,
             "amount": earned_commission,
             "source": "referral_commission",
             "description": f"Commission from referral {referral['referral_code']}",
             "status": "pending"
-        }).execute()
+        }))
         
         return {"message": "Referral completed successfully", "commission_earned": earned_commission}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/earnings/", response_model=List[EarningResponse])
+@router.get("/earnings/", response_model=List[partial_model(EarningResponse)], response_model_exclude_unset=True)
 async def get_earnings(
+    http_response: Response,
     user_id: Optional[str] = None,
     status: Optional[str] = None,
     source: Optional[str] = None,
-    limit: int = 50,
-    offset: int = 0
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Database = Depends(get_db)
 ):
     """Get referral earnings with filtering"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, EarningResponse, KEYSET_COLUMNS)
     try:
-        query = supabase.table("referral_earnings").select("*")
+        query = db.table("referral_earnings").select(select)
         
         if user_id:
             query = query.eq("user_id", user_id)
@@ -191,16 +198,17 @@ async def get_earnings(
         if source:
             query = query.eq("source", source)
         
-        response = query.range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(query, limit, offset, keyset))
+        return rows_response(page(response.data, limit, http_response), EarningResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/earnings/{earning_id}", response_model=EarningResponse)
-async def get_earning(earning_id: str):
+@router.get("/earnings/{earning_id}", response_model=partial_model(EarningResponse), response_model_exclude_unset=True)
+async def get_earning(earning_id: str, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get earning by ID"""
+    select = select_fields(fields, EarningResponse)
     try:
-        response = supabase.table("referral_earnings").select("*").eq("id", earning_id).single().execute()
+        response = await db.execute(db.table("referral_earnings").select(select).eq("id", earning_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Earning not found")
@@ -210,29 +218,29 @@ async def get_earning(earning_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/earnings/", response_model=EarningResponse)
-async def create_earning(earning: EarningCreate):
+async def create_earning(earning: EarningCreate, db: Database = Depends(get_db)):
     """Create new earning record"""
     try:
-        response = supabase.table("referral_earnings").insert({
+        response = await db.execute(db.table("referral_earnings").insert({
             "user_id": earning.user_id,
             "referral_id": earning.referral_id,
             "amount": earning.amount,
             "source": earning.source,
             "description": earning.description,
             "status": "pending"
-        }).execute()
+        }))
         
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/earnings/{earning_id}/pay")
-async def pay_earning(earning_id: str):
+async def pay_earning(earning_id: str, db: Database = Depends(get_db)):
     """Mark earning as paid"""
     try:
-        response = supabase.table("referral_earnings").update({
+        response = await db.execute(db.table("referral_earnings").update({
             "status": "paid"
-        }).eq("id", earning_id).execute()
+        }).eq("id", earning_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Earning not found")
@@ -242,18 +250,18 @@ async def pay_earning(earning_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/stats/{user_id}", response_model=ReferralStats)
-async def get_user_referral_stats(user_id: str):
+async def get_user_referral_stats(user_id: str, db: Database = Depends(get_db)):
     """Get user's referral statistics"""
     try:
         # Get referral stats
-        referrals = supabase.table("referrals").select("*").eq("referrer_id", user_id).execute()
+        referrals = await db.execute(db.table("referrals").select("*").eq("referrer_id", user_id))
         
         total_referrals = len(referrals.data)
         active_referrals = len([r for r in referrals.data if r["status"] == "active"])
         pending_referrals = len([r for r in referrals.data if r["status"] == "pending"])
         
         # Get earnings stats
-        earnings = supabase.table("referral_earnings").select("*").eq("user_id", user_id).execute()
+        earnings = await db.execute(db.table("referral_earnings").select("*").eq("user_id", user_id))
         
         total_earnings = sum([e["amount"] for e in earnings.data])
         pending_earnings = sum([e["amount"] for e in earnings.data if e["status"] == "pending"])
@@ -271,10 +279,10 @@ async def get_user_referral_stats(user_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/code/{referral_code}")
-async def get_referral_by_code(referral_code: str):
+async def get_referral_by_code(referral_code: str, db: Database = Depends(get_db)):
     """Get referral by code"""
     try:
-        response = supabase.table("referrals").select("*").eq("referral_code", referral_code).single().execute()
+        response = await db.execute(db.table("referrals").select("*").eq("referral_code", referral_code).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Referral code not found")
@@ -284,11 +292,11 @@ async def get_referral_by_code(referral_code: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/process-signup")
-async def process_referral_signup(referral_code: str, new_user_id: str):
+async def process_referral_signup(referral_code: str, new_user_id: str, db: Database = Depends(get_db)):
     """Process referral when new user signs up"""
     try:
         # Find referral by code
-        referral_response = supabase.table("referrals").select("*").eq("referral_code", referral_code).single().execute()
+        referral_response = await db.execute(db.table("referrals").select("*").eq("referral_code", referral_code).single())
         
         if not referral_response.data:
             raise HTTPException(status_code=404, detail="Invalid referral code")
@@ -296,15 +304,15 @@ async def process_referral_signup(referral_code: str, new_user_id: str):
         referral = referral_response.data
         
         # Update referral with new user ID
-        supabase.table("referrals").update({
+        await db.execute(db.table("referrals").update({
             "referred_user_id": new_user_id,
             "status": "active"
-        }).eq("id", referral["id"]).execute()
+        }).eq("id", referral["id"]))
         
         # Update user's referred_by field
-        supabase.table("users").update({
+        await db.execute(db.table("users").update({
             "referred_by": referral["referrer_id"]
-        }).eq("id", new_user_id).execute()
+        }).eq("id", new_user_id))
         
         return {"message": "Referral processed successfully"}
     except Exception as e:
@@ -1,21 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
 from datetime import datetime
 
-load_dotenv()
+from database import Database, get_db
+from lookups import lookups
+from pagination import KEYSET_COLUMNS, MAX_PAGE_SIZE, decode_cursor, page, paginate
+from projection import partial_model, select_fields
+from responses import rows_response
 
 router = APIRouter()
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-)
-
 class ServiceCreate(BaseModel):
     name: str
     description: str
@@ -85,32 +80,47 @@ class ReviewResponse(BaseModel):
     created_at: str
     updated_at: str
 
-@router.get("/", response_model=List[ServiceResponse])
+@router.get("/", response_model=List[partial_model(ServiceResponse)], response_model_exclude_unset=True)
 async def get_services(
+    http_response: Response,
     category: Optional[str] = None,
     is_active: Optional[bool] = None,
-    limit: int = 50,
-    offset: int = 0
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Database = Depends(get_db)
 ):
     """Get services with filtering"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, ServiceResponse, KEYSET_COLUMNS)
     try:
-        query = supabase.table("services").select("*")
+        query = db.table("services").select(select)
         
         if category:
             query = query.eq("category", category)
         if is_active is not None:
             query = query.eq("is_active", is_active)
         
-        response = query.range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(query, limit, offset, keyset))
+        return rows_response(page(response.data, limit, http_response), ServiceResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/{service_id}", response_model=ServiceResponse)
-async def get_service(service_id: str):
+@router.get("/categories")
+async def get_service_categories(db: Database = Depends(get_db)):
+    """Get available service categories"""
+    try:
+        return {"categories": await lookups.get("service_categories", db)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{service_id}", response_model=partial_model(ServiceResponse), response_model_exclude_unset=True)
+async def get_service(service_id: str, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get service by ID"""
+    select = select_fields(fields, ServiceResponse)
     try:
-        response = supabase.table("services").select("*").eq("id", service_id).single().execute()
+        response = await db.execute(db.table("services").select(select).eq("id", service_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Service not found")
@@ -120,10 +130,10 @@ async def get_service(service_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/", response_model=ServiceResponse)
-async def create_service(service: ServiceCreate):
+async def create_service(service: ServiceCreate, db: Database = Depends(get_db)):
     """Create new service"""
     try:
-        response = supabase.table("services").insert({
+        response = await db.execute(db.table("services").insert({
             "name": service.name,
             "description": service.description,
             "category": service.category,
@@ -132,17 +142,18 @@ async def create_service(service: ServiceCreate):
             "requirements": service.requirements,
             "available_slots": service.available_slots,
             "is_active": True
-        }).execute()
+        }))
         
+        lookups.invalidate("service_categories")
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/{service_id}", response_model=ServiceResponse)
-async def update_service(service_id: str, service: ServiceCreate):
+async def update_service(service_id: str, service: ServiceCreate, db: Database = Depends(get_db)):
     """Update service"""
     try:
-        response = supabase.table("services").update({
+        response = await db.execute(db.table("services").update({
             "name": service.name,
             "description": service.description,
             "category": service.category,
@@ -150,20 +161,21 @@ async def update_service(service_id: str, service: ServiceCreate):
             "duration": service.duration,
             "requirements": service.requirements,
             "available_slots": service.available_slots
-        }).eq("id", service_id).execute()
+        }).eq("id", service_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Service not found")
         
+        lookups.invalidate("service_categories")
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{service_id}")
-async def delete_service(service_id: str):
+async def delete_service(service_id: str, db: Database = Depends(get_db)):
     """Delete service"""
     try:
-        response = supabase.table("services").update({"is_active": False}).eq("id", service_id).execute()
+        response = await db.execute(db.table("services").update({"is_active": False}).eq("id", service_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Service not found")
@@ -173,10 +185,10 @@ async def delete_service(service_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/bookings/", response_model=BookingResponse)
-async def create_booking(booking: BookingCreate):
+async def create_booking(booking: BookingCreate, db: Database = Depends(get_db)):
     """Create new booking"""
     try:
-        response = supabase.table("bookings").insert({
+        response = await db.execute(db.table("bookings").insert({
             "user_id": booking.user_id,
             "service_id": booking.service_id,
             "preferred_date": booking.preferred_date,
@@ -185,24 +197,30 @@ async def create_booking(booking: BookingCreate):
             "contact_info": booking.contact_info,
             "status": "pending",
             "payment_status": "pending"
-        }).execute()
+        }))
         
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/bookings/", response_model=List[BookingResponse])
+@router.get("/bookings/", response_model=List[partial_model(BookingResponse)], response_model_exclude_unset=True)
 async def get_bookings(
+    http_response: Response,
     user_id: Optional[str] = None,
     service_id: Optional[str] = None,
     status: Optional[str] = None,
     assigned_staff: Optional[str] = None,
-    limit: int = 50,
-    offset: int = 0
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Database = Depends(get_db)
 ):
     """Get bookings with filtering"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, BookingResponse, KEYSET_COLUMNS)
     try:
-        query = supabase.table("bookings").select("*")
+        query = db.table("bookings").select(select)
         
         if user_id:
             query = query.eq("user_id", user_id)
@@ -213,16 +231,17 @@ async def get_bookings(
         if assigned_staff:
             query = query.eq("assigned_staff", assigned_staff)
         
-        response = query.range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(query, limit, offset, keyset))
+        return rows_response(page(response.data, limit, http_response), BookingResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/bookings/{booking_id}", response_model=BookingResponse)
-async def get_booking(booking_id: str):
+@router.get("/bookings/{booking_id}", response_model=partial_model(BookingResponse), response_model_exclude_unset=True)
+async def get_booking(booking_id: str, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get booking by ID"""
+    select = select_fields(fields, BookingResponse)
     try:
-        response = supabase.table("bookings").select("*").eq("id", booking_id).single().execute()
+        response = await db.execute(db.table("bookings").select(select).eq("id", booking_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -232,12 +251,12 @@ async def get_booking(booking_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/bookings/{booking_id}", response_model=BookingResponse)
-async def update_booking(booking_id: str, booking: BookingUpdate):
+async def update_booking(booking_id: str, booking: BookingUpdate, db: Database = Depends(get_db)):
     """Update booking"""
     try:
         update_data = {k: v for k, v in booking.dict().items() if v is not None}
         
-        response = supabase.table("bookings").update(update_data).eq("id", booking_id).execute()
+        response = await db.execute(db.table("bookings").update(update_data).eq("id", booking_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -247,10 +266,10 @@ async def update_booking(booking_id: str, booking: BookingUpdate):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/bookings/{booking_id}")
-async def cancel_booking(booking_id: str):
+async def cancel_booking(booking_id: str, db: Database = Depends(get_db)):
     """Cancel booking"""
     try:
-        response = supabase.table("bookings").update({"status": "cancelled"}).eq("id", booking_id).execute()
+        response = await db.execute(db.table("bookings").update({"status": "cancelled"}).eq("id", booking_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -260,15 +279,15 @@ async def cancel_booking(booking_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/bookings/{booking_id}/confirm")
-async def confirm_booking(booking_id: str, staff_id: str, actual_date: str, actual_time: str):
+async def confirm_booking(booking_id: str, staff_id: str, actual_date: str, actual_time: str, db: Database = Depends(get_db)):
     """Confirm booking with staff assignment"""
     try:
-        response = supabase.table("bookings").update({
+        response = await db.execute(db.table("bookings").update({
             "status": "confirmed",
             "assigned_staff": staff_id,
             "actual_date": actual_date,
             "actual_time": actual_time
-        }).eq("id", booking_id).execute()
+        }).eq("id", booking_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -278,13 +297,13 @@ async def confirm_booking(booking_id: str, staff_id: str, actual_date: str, actu
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/bookings/{booking_id}/complete")
-async def complete_booking(booking_id: str, completion_notes: Optional[str] = None):
+async def complete_booking(booking_id: str, completion_notes: Optional[str] = None, db: Database = Depends(get_db)):
     """Mark booking as completed"""
     try:
-        response = supabase.table("bookings").update({
+        response = await db.execute(db.table("bookings").update({
             "status": "completed",
             "completion_notes": completion_notes
-        }).eq("id", booking_id).execute()
+        }).eq("id", booking_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -294,11 +313,11 @@ async def complete_booking(booking_id: str, completion_notes: Optional[str] = No
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/reviews/", response_model=ReviewResponse)
-async def create_review(review: ReviewCreate):
+async def create_review(review: ReviewCreate, db: Database = Depends(get_db)):
     """Create service review"""
     try:
         # Check if booking exists and is completed
-        booking_response = supabase.table("bookings").select("*").eq("id", review.booking_id).single().execute()
+        booking_response = await db.execute(db.table("bookings").select("*").eq("id", review.booking_id).single())
         
         if not booking_response.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -311,45 +330,55 @@ async def create_review(review: ReviewCreate):
         if booking["user_id"] != review.user_id:
             raise HTTPException(status_code=403, detail="Not authorized to review this booking")
         
-        response = supabase.table("service_reviews").insert({
+        response = await db.execute(db.table("service_reviews").insert({
             "booking_id": review.booking_id,
             "user_id": review.user_id,
             "rating": review.rating,
             "comment": review.comment
-        }).execute()
+        }))
         
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/reviews/", response_model=List[ReviewResponse])
+@router.get("/reviews/", response_model=List[partial_model(ReviewResponse)], response_model_exclude_unset=True)
 async def get_reviews(
+    http_response: Response,
     service_id: Optional[str] = None,
     user_id: Optional[str] = None,
-    limit: int = 50,
-    offset: int = 0
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Database = Depends(get_db)
 ):
     """Get service reviews"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, ReviewResponse, KEYSET_COLUMNS)
     try:
-        query = supabase.table("service_reviews").select("*")
-        
         if service_id:
             # Join with bookings to filter by service
-            query = query.select("*, bookings!inner(service_id)").eq("bookings.service_id", service_id)
+            query = db.table("service_reviews").select(f"{select},bookings!inner(service_id)").eq("bookings.service_id", service_id)
+        else:
+            query = db.table("service_reviews").select(select)
         
         if user_id:
             query = query.eq("user_id", user_id)
         
-        response = query.range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(query, limit, offset, keyset))
+        rows = page(response.data, limit, http_response)
+        for row in rows:
+            row.pop("bookings", None)
+        return rows_response(rows, ReviewResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/reviews/{review_id}", response_model=ReviewResponse)
-async def get_review(review_id: str):
+@router.get("/reviews/{review_id}", response_model=partial_model(ReviewResponse), response_model_exclude_unset=True)
+async def get_review(review_id: str, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get review by ID"""
+    select = select_fields(fields, ReviewResponse)
     try:
-        response = supabase.table("service_reviews").select("*").eq("id", review_id).single().execute()
+        response = await db.execute(db.table("service_reviews").select(select).eq("id", review_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Review not found")
@@ -358,22 +387,12 @@ async def get_review(review_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/categories")
-async def get_service_categories():
-    """Get available service categories"""
-    try:
-        response = supabase.table("services").select("category").execute()
-        categories = list(set([item["category"] for item in response.data]))
-        return {"categories": categories}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
 @router.get("/{service_id}/availability")
-async def get_service_availability(service_id: str, date: str):
+async def get_service_availability(service_id: str, date: str, db: Database = Depends(get_db)):
     """Get service availability for a specific date"""
     try:
         # Get service details
-        service_response = supabase.table("services").select("*").eq("id", service_id).single().execute()
+        service_response = await db.execute(db.table("services").select("*").eq("id", service_id).single())
         
         if not service_response.data:
             raise HTTPException(status_code=404, detail="Service not found")
@@ -389,7 +408,7 @@ async def get_service_availability(service_id: str, date: str):
         day_slots = available_slots.get(day_of_week, [])
         
         # Get existing bookings for the date
-        bookings = supabase.table("bookings").select("preferred_time, actual_time").eq("service_id", service_id).or_(f"preferred_date.eq.{date},actual_date.eq.{date}").execute()
+        bookings = await db.execute(db.table("bookings").select("preferred_time, actual_time").eq("service_id", service_id).or_(f"preferred_date.eq.{date},actual_date.eq.{date}"))
         
         # Remove booked slots
         booked_times = []
@@ -411,11 +430,11 @@ async def get_service_availability(service_id: str, date: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{service_id}/stats")
-async def get_service_stats(service_id: str):
+async def get_service_stats(service_id: str, db: Database = Depends(get_db)):
     """Get service statistics"""
     try:
         # Get booking stats
-        bookings = supabase.table("bookings").select("*").eq("service_id", service_id).execute()
+        bookings = await db.execute(db.table("bookings").select("*").eq("service_id", service_id))
         
         total_bookings = len(bookings.data)
         completed_bookings = len([b for b in bookings.data if b["status"] == "completed"])
@@ -423,7 +442,7 @@ async def get_service_stats(service_id: str):
         cancelled_bookings = len([b for b in bookings.data if b["status"] == "cancelled"])
         
         # Get review stats
-        reviews = supabase.table("service_reviews").select("rating, bookings!inner(service_id)").eq("bookings.service_id", service_id).execute()
+        reviews = await db.execute(db.table("service_reviews").select("rating, bookings!inner(service_id)").eq("bookings.service_id", service_id))
         
         total_reviews = len(reviews.data)
         average_rating = sum([r["rating"] for r in reviews.data]) / total_reviews if total_reviews > 0 else 0
@@ -440,20 +459,22 @@ async def get_service_stats(service_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/user/{user_id}/bookings", response_model=List[BookingResponse])
-async def get_user_bookings(user_id: str, limit: int = 50, offset: int = 0):
+@router.get("/user/{user_id}/bookings", response_model=List[partial_model(BookingResponse)], response_model_exclude_unset=True)
+async def get_user_bookings(http_response: Response, user_id: str, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0), cursor: Optional[str] = None, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get user's bookings"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, BookingResponse, KEYSET_COLUMNS)
     try:
-        response = supabase.table("bookings").select("*").eq("user_id", user_id).range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(db.table("bookings").select(select).eq("user_id", user_id), limit, offset, keyset))
+        return rows_response(page(response.data, limit, http_response), BookingResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/staff/{staff_id}/bookings", response_model=List[BookingResponse])
-async def get_staff_bookings(staff_id: str, limit: int = 50, offset: int = 0):
+async def get_staff_bookings(staff_id: str, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0), db: Database = Depends(get_db)):
     """Get staff's assigned bookings"""
     try:
-        response = supabase.table("bookings").select("*").eq("assigned_staff", staff_id).range(offset, offset + limit - 1).order("actual_date", desc=True).execute()
+        response = await db.execute(db.table("bookings").select("*").eq("assigned_staff", staff_id).range(offset, offset + limit - 1).order("actual_date", desc=True))
         return response.data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,19 +1,26 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
 
-load_dotenv()
+from cache import TTLCache
+from database import Database, get_db
+from lookups import lookups
+from pagination import KEYSET_COLUMNS, MAX_PAGE_SIZE, decode_cursor, page, paginate
+from projection import partial_model, select_fields
+from responses import rows_response
+from staff_performance import staff_performance
 
 router = APIRouter()
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-)
+STAFF_PERFORMANCE_CACHE_TTL = float(os.getenv("STAFF_PERFORMANCE_CACHE_TTL", "30"))
+
+# staff_id -> performance metrics; task writes drop the assignee's entry
+_performance_cache = TTLCache(ttl=STAFF_PERFORMANCE_CACHE_TTL, maxsize=10000)
+
+def _task_changed(staff_id: str):
+    _performance_cache.delete(staff_id)
+    staff_performance.task_changed(staff_id)
 
 class StaffCreate(BaseModel):
     user_id: str
@@ -73,17 +80,23 @@ class TaskResponse(BaseModel):
     created_at: str
     updated_at: str
 
-@router.get("/", response_model=List[StaffResponse])
+@router.get("/", response_model=List[partial_model(StaffResponse)], response_model_exclude_unset=True)
 async def get_staff(
+    http_response: Response,
     department: Optional[str] = None,
     position: Optional[str] = None,
     is_active: Optional[bool] = None,
-    limit: int = 50,
-    offset: int = 0
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Database = Depends(get_db)
 ):
     """Get staff members with filtering"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, StaffResponse, KEYSET_COLUMNS)
     try:
-        query = supabase.table("staff").select("*")
+        query = db.table("staff").select(select)
         
         if department:
             query = query.eq("department", department)
@@ -92,16 +105,77 @@ async def get_staff(
         if is_active is not None:
             query = query.eq("is_active", is_active)
         
-        response = query.range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(query, limit, offset, keyset))
+        return rows_response(page(response.data, limit, http_response), StaffResponse, http_response, fields=fields)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/performance")
+async def get_department_performance(department: Optional[str] = None, refresh: bool = False, db: Database = Depends(get_db)):
+    """Get task metrics per staff member and per department"""
+    try:
+        return await staff_performance.summary(db, department, refresh)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/departments")
+async def get_departments(db: Database = Depends(get_db)):
+    """Get available departments"""
+    try:
+        return {"departments": await lookups.get("departments", db)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/positions")
+async def get_positions(db: Database = Depends(get_db)):
+    """Get available positions"""
+    try:
+        return {"positions": await lookups.get("positions", db)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/tasks", response_model=List[partial_model(TaskResponse)], response_model_exclude_unset=True)
+async def get_tasks(
+    http_response: Response,
+    assigned_to: Optional[str] = None,
+    assigned_by: Optional[str] = None,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    category: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Database = Depends(get_db)
+):
+    """Get tasks with filtering"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, TaskResponse, KEYSET_COLUMNS)
+    try:
+        query = db.table("staff_tasks").select(select)
+        
+        if assigned_to:
+            query = query.eq("assigned_to", assigned_to)
+        if assigned_by:
+            query = query.eq("assigned_by", assigned_by)
+        if status:
+            query = query.eq("status", status)
+        if priority:
+            query = query.eq("priority", priority)
+        if category:
+            query = query.eq("category", category)
+        
+        response = await db.execute(paginate(query, limit, offset, keyset))
+        return rows_response(page(response.data, limit, http_response), TaskResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/{staff_id}", response_model=StaffResponse)
-async def get_staff_member(staff_id: str):
+@router.get("/{staff_id}", response_model=partial_model(StaffResponse), response_model_exclude_unset=True)
+async def get_staff_member(staff_id: str, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get staff member by ID"""
+    select = select_fields(fields, StaffResponse)
     try:
-        response = supabase.table("staff").select("*").eq("id", staff_id).single().execute()
+        response = await db.execute(db.table("staff").select(select).eq("id", staff_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Staff member not found")
@@ -111,10 +185,10 @@ async def get_staff_member(staff_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/", response_model=StaffResponse)
-async def create_staff_member(staff: StaffCreate):
+async def create_staff_member(staff: StaffCreate, db: Database = Depends(get_db)):
     """Create new staff member"""
     try:
-        response = supabase.table("staff").insert({
+        response = await db.execute(db.table("staff").insert({
             "user_id": staff.user_id,
             "department": staff.department,
             "position": staff.position,
@@ -122,75 +196,51 @@ async def create_staff_member(staff: StaffCreate):
             "hire_date": staff.hire_date,
             "permissions": staff.permissions,
             "is_active": True
-        }).execute()
+        }))
         
+        staff_performance.staff_changed()
+        lookups.invalidate("departments", "positions")
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/{staff_id}", response_model=StaffResponse)
-async def update_staff_member(staff_id: str, staff: StaffUpdate):
+async def update_staff_member(staff_id: str, staff: StaffUpdate, db: Database = Depends(get_db)):
     """Update staff member"""
     try:
         update_data = {k: v for k, v in staff.dict().items() if v is not None}
         
-        response = supabase.table("staff").update(update_data).eq("id", staff_id).execute()
+        response = await db.execute(db.table("staff").update(update_data).eq("id", staff_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Staff member not found")
         
+        staff_performance.staff_changed()
+        lookups.invalidate("departments", "positions")
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{staff_id}")
-async def delete_staff_member(staff_id: str):
+async def delete_staff_member(staff_id: str, db: Database = Depends(get_db)):
     """Delete staff member"""
     try:
-        response = supabase.table("staff").update({"is_active": False}).eq("id", staff_id).execute()
+        response = await db.execute(db.table("staff").update({"is_active": False}).eq("id", staff_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Staff member not found")
         
+        staff_performance.staff_changed()
         return {"message": "Staff member deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/tasks", response_model=List[TaskResponse])
-async def get_tasks(
-    assigned_to: Optional[str] = None,
-    assigned_by: Optional[str] = None,
-    status: Optional[str] = None,
-    priority: Optional[str] = None,
-    category: Optional[str] = None,
-    limit: int = 50,
-    offset: int = 0
-):
-    """Get tasks with filtering"""
-    try:
-        query = supabase.table("staff_tasks").select("*")
-        
-        if assigned_to:
-            query = query.eq("assigned_to", assigned_to)
-        if assigned_by:
-            query = query.eq("assigned_by", assigned_by)
-        if status:
-            query = query.eq("status", status)
-        if priority:
-            query = query.eq("priority", priority)
-        if category:
-            query = query.eq("category", category)
-        
-        response = query.range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@router.get("/tasks/{task_id}", response_model=TaskResponse)
-async def get_task(task_id: str):
+@router.get("/tasks/{task_id}", response_model=partial_model(TaskResponse), response_model_exclude_unset=True)
+async def get_task(task_id: str, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get task by ID"""
+    select = select_fields(fields, TaskResponse)
     try:
-        response = supabase.table("staff_tasks").select("*").eq("id", task_id).single().execute()
+        response = await db.execute(db.table("staff_tasks").select(select).eq("id", task_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Task not found")
@@ -200,10 +250,10 @@ async def get_task(task_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/tasks", response_model=TaskResponse)
-async def create_task(task: TaskCreate):
+async def create_task(task: TaskCreate, db: Database = Depends(get_db)):
     """Create new task"""
     try:
-        response = supabase.table("staff_tasks").insert({
+        response = await db.execute(db.table("staff_tasks").insert({
             "assigned_to": task.assigned_to,
             "assigned_by": task.assigned_by,
             "title": task.title,
@@ -213,87 +263,77 @@ async def create_task(task: TaskCreate):
             "category": task.category,
             "status": "pending",
             "progress": 0
-        }).execute()
+        }))
         
+        _task_changed(task.assigned_to)
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/tasks/{task_id}", response_model=TaskResponse)
-async def update_task(task_id: str, task: TaskUpdate):
+async def update_task(task_id: str, task: TaskUpdate, db: Database = Depends(get_db)):
     """Update task"""
     try:
         update_data = {k: v for k, v in task.dict().items() if v is not None}
         
-        response = supabase.table("staff_tasks").update(update_data).eq("id", task_id).execute()
+        response = await db.execute(db.table("staff_tasks").update(update_data).eq("id", task_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Task not found")
         
+        _task_changed(response.data[0]["assigned_to"])
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/tasks/{task_id}")
-async def delete_task(task_id: str):
+async def delete_task(task_id: str, db: Database = Depends(get_db)):
     """Delete task"""
     try:
-        response = supabase.table("staff_tasks").delete().eq("id", task_id).execute()
+        response = await db.execute(db.table("staff_tasks").delete().eq("id", task_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="Task not found")
         
+        _task_changed(response.data[0]["assigned_to"])
         return {"message": "Task deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/departments")
-async def get_departments():
-    """Get available departments"""
-    try:
-        response = supabase.table("staff").select("department").execute()
-        departments = list(set([item["department"] for item in response.data]))
-        return {"departments": departments}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@router.get("/positions")
-async def get_positions():
-    """Get available positions"""
-    try:
-        response = supabase.table("staff").select("position").execute()
-        positions = list(set([item["position"] for item in response.data]))
-        return {"positions": positions}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@router.get("/{staff_id}/tasks", response_model=List[TaskResponse])
-async def get_staff_tasks(staff_id: str, limit: int = 50, offset: int = 0):
+@router.get("/{staff_id}/tasks", response_model=List[partial_model(TaskResponse)], response_model_exclude_unset=True)
+async def get_staff_tasks(http_response: Response, staff_id: str, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0), cursor: Optional[str] = None, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get tasks assigned to a staff member"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, TaskResponse, KEYSET_COLUMNS)
     try:
-        response = supabase.table("staff_tasks").select("*").eq("assigned_to", staff_id).range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(db.table("staff_tasks").select(select).eq("assigned_to", staff_id), limit, offset, keyset))
+        return rows_response(page(response.data, limit, http_response), TaskResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{staff_id}/performance")
-async def get_staff_performance(staff_id: str):
+async def get_staff_performance(staff_id: str, db: Database = Depends(get_db)):
     """Get staff performance metrics"""
     try:
-        # Get task statistics
-        tasks = supabase.table("staff_tasks").select("*").eq("assigned_to", staff_id).execute()
+        performance = _performance_cache.get(staff_id)
+        if performance is not None:
+            return performance
+        
+        # Get task statistics (counted in the database, migrations/008_staff_task_stats.sql)
+        stats = await db.execute(db.rpc("staff_task_stats", {"p_staff_id": staff_id}))
+        counts = stats.data[0]
         
-        total_tasks = len(tasks.data)
-        completed_tasks = len([t for t in tasks.data if t["status"] == "completed"])
-        pending_tasks = len([t for t in tasks.data if t["status"] == "pending"])
-        in_progress_tasks = len([t for t in tasks.data if t["status"] == "in_progress"])
+        total_tasks = counts["total_tasks"]
+        completed_tasks = counts["completed_tasks"]
         
-        return {
+        performance = {
             "total_tasks": total_tasks,
             "completed_tasks": completed_tasks,
-            "pending_tasks": pending_tasks,
-            "in_progress_tasks": in_progress_tasks,
+            "pending_tasks": counts["pending_tasks"],
+            "in_progress_tasks": counts["in_progress_tasks"],
             "completion_rate": (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
         }
+        _performance_cache.set(staff_id, performance)
+        return performance
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,20 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
-import os
-from supabase import create_client, Client
-from dotenv import load_dotenv
 
-load_dotenv()
+from database import Database, get_db
+from pagination import KEYSET_COLUMNS, MAX_PAGE_SIZE, decode_cursor, page, paginate
+from projection import partial_model, select_fields
+from responses import rows_response
+from security import get_current_user_verified, invalidate_profile
+from .orders import order_select
 
 router = APIRouter()
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-)
-
 class UserUpdate(BaseModel):
     name: Optional[str] = None
     email: Optional[EmailStr] = None
@@ -35,25 +31,28 @@ class UserResponse(BaseModel):
     created_at: str
     updated_at: str
 
-@router.get("/", response_model=List[UserResponse])
-async def get_users(role: Optional[str] = None, limit: int = 50, offset: int = 0):
+@router.get("/", response_model=List[partial_model(UserResponse)], response_model_exclude_unset=True)
+async def get_users(http_response: Response, role: Optional[str] = None, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0), cursor: Optional[str] = None, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get all users with optional filtering"""
+    keyset = decode_cursor(cursor)
+    select = select_fields(fields, UserResponse, KEYSET_COLUMNS)
     try:
-        query = supabase.table("users").select("*")
+        query = db.table("users").select(select)
         
         if role:
             query = query.eq("role", role)
         
-        response = query.range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(query, limit, offset, keyset))
+        return rows_response(page(response.data, limit, http_response), UserResponse, http_response, fields=fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: str):
+@router.get("/{user_id}", response_model=partial_model(UserResponse), response_model_exclude_unset=True)
+async def get_user(user_id: str, fields: Optional[str] = None, db: Database = Depends(get_db)):
     """Get user by ID"""
+    select = select_fields(fields, UserResponse)
     try:
-        response = supabase.table("users").select("*").eq("id", user_id).single().execute()
+        response = await db.execute(db.table("users").select(select).eq("id", user_id).single())
         
         if not response.data:
             raise HTTPException(status_code=404, detail="User not found")
@@ -63,86 +62,97 @@ async def get_user(user_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/{user_id}", response_model=UserResponse)
-async def update_user(user_id: str, user: UserUpdate):
+async def update_user(user_id: str, user: UserUpdate, db: Database = Depends(get_db)):
     """Update user profile"""
     try:
         update_data = {k: v for k, v in user.dict().items() if v is not None}
         
-        response = supabase.table("users").update(update_data).eq("id", user_id).execute()
+        response = await db.execute(db.table("users").update(update_data).eq("id", user_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="User not found")
         
+        invalidate_profile(user_id)
+        
         return response.data[0]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.delete("/{user_id}")
-async def delete_user(user_id: str):
+@router.delete("/{user_id}", dependencies=[Depends(get_current_user_verified)])
+async def delete_user(user_id: str, db: Database = Depends(get_db)):
     """Delete user account"""
     try:
         # Delete user from auth
-        supabase.auth.admin.delete_user(user_id)
+        await db.run_sync(db.auth.admin.delete_user, user_id)
         
         # Delete user from users table
-        response = supabase.table("users").delete().eq("id", user_id).execute()
+        response = await db.execute(db.table("users").delete().eq("id", user_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="User not found")
         
+        invalidate_profile(user_id)
+        
         return {"message": "User deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{user_id}/referrals")
-async def get_user_referrals(user_id: str):
+async def get_user_referrals(user_id: str, db: Database = Depends(get_db)):
     """Get users referred by this user"""
     try:
-        response = supabase.table("users").select("*").eq("referred_by", user_id).execute()
+        response = await db.execute(db.table("users").select("*").eq("referred_by", user_id))
         return response.data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{user_id}/orders")
-async def get_user_orders(user_id: str, limit: int = 10, offset: int = 0):
+async def get_user_orders(http_response: Response, user_id: str, limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0), cursor: Optional[str] = None, expand: Optional[str] = None, db: Database = Depends(get_db)):
     """Get user's orders"""
+    keyset = decode_cursor(cursor)
+    select = order_select(expand)
     try:
-        response = supabase.table("orders").select("*").eq("user_id", user_id).range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(db.table("orders").select(select).eq("user_id", user_id), limit, offset, keyset))
+        return page(response.data, limit, http_response)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{user_id}/bookings")
-async def get_user_bookings(user_id: str, limit: int = 10, offset: int = 0):
+async def get_user_bookings(http_response: Response, user_id: str, limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0), cursor: Optional[str] = None, db: Database = Depends(get_db)):
     """Get user's service bookings"""
+    keyset = decode_cursor(cursor)
     try:
-        response = supabase.table("bookings").select("*").eq("user_id", user_id).range(offset, offset + limit - 1).order("created_at", desc=True).execute()
-        return response.data
+        response = await db.execute(paginate(db.table("bookings").select("*").eq("user_id", user_id), limit, offset, keyset))
+        return page(response.data, limit, http_response)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/{user_id}/deactivate")
-async def deactivate_user(user_id: str):
+@router.post("/{user_id}/deactivate", dependencies=[Depends(get_current_user_verified)])
+async def deactivate_user(user_id: str, db: Database = Depends(get_db)):
     """Deactivate user account"""
     try:
-        response = supabase.table("users").update({"is_active": False}).eq("id", user_id).execute()
+        response = await db.execute(db.table("users").update({"is_active": False}).eq("id", user_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="User not found")
         
+        invalidate_profile(user_id)
+        
         return {"message": "User deactivated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/{user_id}/activate")
-async def activate_user(user_id: str):
+@router.post("/{user_id}/activate", dependencies=[Depends(get_current_user_verified)])
+async def activate_user(user_id: str, db: Database = Depends(get_db)):
     """Activate user account"""
     try:
-        response = supabase.table("users").update({"is_active": True}).eq("id", user_id).execute()
+        response = await db.execute(db.table("users").update({"is_active": True}).eq("id", user_id))
         
         if not response.data:
             raise HTTPException(status_code=404, detail="User not found")
         
+        invalidate_profile(user_id)
+        
         return {"message": "User activated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
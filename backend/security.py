@@ -0,0 +1,180 @@
+"""Bearer-token authentication for API routes.
+
+Supabase access tokens are JWTs, so they are verified locally instead of asking
+the auth server on every request: HS256 tokens with the project's JWT secret
+(``SUPABASE_JWT_SECRET``), asymmetric tokens with the project's JWKS, which is
+fetched once and cached. Verified claims and the caller's ``users`` profile are
+cached until the token expires.
+
+Local verification cannot see revoked sessions (sign-out, password change,
+banned users) before the token expires. Revocation-sensitive routes should
+depend on :func:`get_current_user_verified`, which additionally confirms the
+token with the auth server. Tokens signed out through this API
+(:func:`revoke_token`) are refused locally as well, by the worker that
+handled the sign-out.
+"""
+
+import os
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import jwt, JWTError
+from pydantic import BaseModel
+
+from cache import TTLCache
+from database import Database, get_db
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+JWKS_CACHE_TTL = float(os.getenv("JWKS_CACHE_TTL", "3600"))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "300"))
+
+security = HTTPBearer()
+
+_claims_cache = TTLCache(ttl=60, maxsize=50000)
+_profile_cache = TTLCache(ttl=PROFILE_CACHE_TTL, maxsize=50000)
+_jwks_cache = TTLCache(ttl=JWKS_CACHE_TTL, maxsize=1)
+# Tokens signed out through /api/auth/logout, kept until they expire
+_revoked_tokens = TTLCache(ttl=3600, maxsize=50000)
+
+
+class CurrentUser(BaseModel):
+    id: str
+    email: Optional[str] = None
+    role: Optional[str] = None
+    claims: Dict[str, Any]
+    profile: Optional[Dict[str, Any]] = None
+
+
+async def _get_jwks(db: Database, refresh: bool = False) -> Dict[str, Any]:
+    jwks = None if refresh else _jwks_cache.get("jwks")
+    if jwks is None:
+        async with httpx.AsyncClient(timeout=5) as client:
+            response = await client.get(
+                f"{db.settings.url}/auth/v1/.well-known/jwks.json",
+                headers={"apikey": db.settings.key}
+            )
+            response.raise_for_status()
+        jwks = {key["kid"]: key for key in response.json().get("keys", []) if "kid" in key}
+        _jwks_cache.set("jwks", jwks)
+    return jwks
+
+
+async def _remote_claims(token: str, db: Database) -> Dict[str, Any]:
+    """Verify with the auth server; used when the token cannot be checked locally"""
+    response = await db.run_sync(db.auth.get_user, token)
+    if not response or not response.user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    claims = jwt.get_unverified_claims(token)
+    if claims.get("sub") != response.user.id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return claims
+
+
+async def verify_token(token: str, db: Database) -> Dict[str, Any]:
+    """Return the verified claims of a Supabase access token, from cache when possible"""
+    if token in _revoked_tokens:
+        raise HTTPException(status_code=401, detail="Token revoked")
+
+    claims = _claims_cache.get(token)
+    if claims is not None:
+        return claims
+
+    try:
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg")
+        options = {"verify_aud": bool(SUPABASE_JWT_AUDIENCE)}
+
+        if algorithm == "HS256":
+            if not SUPABASE_JWT_SECRET:
+                claims = await _remote_claims(token, db)
+            else:
+                claims = jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=["HS256"], audience=SUPABASE_JWT_AUDIENCE, options=options)
+        else:
+            jwks = await _get_jwks(db)
+            key = jwks.get(header.get("kid"))
+            if key is None:
+                # Signing keys were rotated since the JWKS was cached
+                key = (await _get_jwks(db, refresh=True)).get(header.get("kid"))
+            if key is None:
+                raise HTTPException(status_code=401, detail="Unknown signing key")
+            claims = jwt.decode(token, key, algorithms=[algorithm], audience=SUPABASE_JWT_AUDIENCE, options=options)
+    except JWTError as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
+
+    expires_in = claims.get("exp", 0) - time.time()
+    _claims_cache.set(token, claims, ttl=expires_in)
+    return claims
+
+
+async def _get_profile(user_id: str, ttl: float, db: Database) -> Optional[Dict[str, Any]]:
+    profile = _profile_cache.get(user_id)
+    if profile is None:
+        response = await db.execute(db.table("users").select("*").eq("id", user_id).limit(1))
+        profile = response.data[0] if response.data else {}
+        _profile_cache.set(user_id, profile, ttl=min(ttl, PROFILE_CACHE_TTL))
+    return profile or None
+
+
+def revoke_token(token: str, claims: Dict[str, Any]):
+    """Refuse a signed-out token from now until it expires"""
+    _claims_cache.delete(token)
+    _revoked_tokens.set(token, True, ttl=max(claims.get("exp", 0) - time.time(), 0))
+
+
+def invalidate_profile(user_id: str):
+    """Drop a cached profile after the users row changes"""
+    _profile_cache.delete(user_id)
+
+
+async def _current_user(token: str, db: Database) -> CurrentUser:
+    claims = await verify_token(token, db)
+    user_id = claims.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    profile = await _get_profile(user_id, claims.get("exp", 0) - time.time(), db)
+    return CurrentUser(
+        id=user_id,
+        email=claims.get("email"),
+        role=(profile or {}).get("role") or claims.get("role"),
+        claims=claims,
+        profile=profile
+    )
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Database = Depends(get_db)
+) -> CurrentUser:
+    """Get current user from a locally verified JWT"""
+    try:
+        return await _current_user(credentials.credentials, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Authentication error: {e}")
+        raise HTTPException(status_code=401, detail="Authentication failed")
+
+
+async def get_current_user_verified(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Database = Depends(get_db)
+) -> CurrentUser:
+    """Like get_current_user, but also confirms with the auth server that the session is still live"""
+    user = await get_current_user(credentials, db)
+    try:
+        await _remote_claims(credentials.credentials, db)
+    except HTTPException:
+        _claims_cache.delete(credentials.credentials)
+        raise
+    except Exception as e:
+        logger.error(f"Authentication error: {e}")
+        raise HTTPException(status_code=401, detail="Authentication failed")
+    return user
@@ -0,0 +1,100 @@
+"""Cached department performance dashboard (GET /api/staff/performance).
+
+Per-member task metrics come from one grouped query over ``staff`` joined to
+``staff_tasks`` (``staff_performance`` in migrations/009_staff_performance.sql);
+department totals are rolled up from the member rows. Summaries are cached
+per department for ``STAFF_DASHBOARD_CACHE_TTL`` seconds.
+
+Task writes mark their assignee as changed. With
+``STAFF_DASHBOARD_INCREMENTAL`` on (the default), the next read of a cached
+summary re-queries only the changed members; otherwise it is rebuilt. Staff
+writes (new members, department moves, deactivation) always drop the cached
+summaries, and ``refresh=true`` forces a rebuild.
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Set
+
+from cache import TTLCache
+from database import Database
+
+STAFF_DASHBOARD_CACHE_TTL = float(os.getenv("STAFF_DASHBOARD_CACHE_TTL", "60"))
+STAFF_DASHBOARD_INCREMENTAL = os.getenv("STAFF_DASHBOARD_INCREMENTAL", "true").strip().lower() in ("1", "true", "yes", "on")
+
+COUNT_FIELDS = ("total_tasks", "completed_tasks", "pending_tasks", "in_progress_tasks", "overdue_tasks")
+
+
+class Summary:
+    __slots__ = ("members", "changed")
+
+    def __init__(self, members: Dict[str, dict]):
+        self.members = members
+        # Members whose tasks changed since their row was loaded
+        self.changed: Set[str] = set()
+
+
+def _with_rate(metrics: Dict[str, Any]) -> Dict[str, Any]:
+    total = metrics["total_tasks"]
+    metrics["completion_rate"] = (metrics["completed_tasks"] / total * 100) if total > 0 else 0
+    return metrics
+
+
+def _department_totals(department: Optional[str], members: List[dict]) -> Dict[str, Any]:
+    totals = {field: sum(member[field] for member in members) for field in COUNT_FIELDS}
+    # Weighted by completed tasks, so the average is over all tasks, not members
+    completion_hours = sum(
+        member["avg_completion_hours"] * member["completed_tasks"]
+        for member in members if member["avg_completion_hours"] is not None
+    )
+    totals["avg_completion_hours"] = completion_hours / totals["completed_tasks"] if totals["completed_tasks"] else None
+    return {"department": department, "staff_count": len(members), **_with_rate(totals)}
+
+
+class StaffPerformance:
+    def __init__(self, ttl: float = STAFF_DASHBOARD_CACHE_TTL, incremental: bool = STAFF_DASHBOARD_INCREMENTAL):
+        self.incremental = incremental
+        # department (None for all) -> Summary
+        self._summaries = TTLCache(ttl=ttl, maxsize=256)
+
+    async def _load(self, db: Database, department: Optional[str], staff_ids: Optional[List[str]] = None) -> Dict[str, dict]:
+        response = await db.execute(db.rpc("staff_performance", {"p_department": department, "p_staff_ids": staff_ids}))
+        return {row["staff_id"]: _with_rate(row) for row in response.data}
+
+    async def summary(self, db: Database, department: Optional[str] = None, refresh: bool = False) -> Dict[str, Any]:
+        summary = None if refresh else self._summaries.get(department)
+
+        if summary is not None and summary.changed:
+            if self.incremental:
+                changed, summary.changed = list(summary.changed), set()
+                summary.members.update(await self._load(db, department, changed))
+            else:
+                summary = None
+
+        if summary is None:
+            summary = Summary(await self._load(db, department))
+            self._summaries.set(department, summary)
+
+        # Members without a department (NULL) sort first and are totalled under None
+        members = sorted(summary.members.values(), key=lambda member: (member["department"] or "", -member["completion_rate"]))
+        by_department: Dict[Optional[str], List[dict]] = {}
+        for member in members:
+            by_department.setdefault(member["department"], []).append(member)
+
+        return {
+            "departments": [_department_totals(name, rows) for name, rows in by_department.items()],
+            "members": members
+        }
+
+    def task_changed(self, staff_id: str):
+        """Called after a task assigned to ``staff_id`` is created, updated or deleted"""
+        for department in self._summaries.keys():
+            summary = self._summaries.get(department)
+            if summary is not None and staff_id in summary.members:
+                summary.changed.add(staff_id)
+
+    def staff_changed(self):
+        """Called after staff rows change; membership of every summary may differ"""
+        self._summaries.clear()
+
+
+staff_performance = StaffPerformance()
@@ -0,0 +1,43 @@
+"""Shared fixtures: the app and a Database whose PostgREST calls go to FakePostgREST"""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from database import Database, DatabaseSettings
+from fakes import FakePostgREST
+
+
+@pytest.fixture
+def postgrest() -> FakePostgREST:
+    return FakePostgREST()
+
+
+@pytest.fixture
+def db(postgrest: FakePostgREST) -> Database:
+    async def create() -> Database:
+        # Built inside an event loop, as lifespan does (anyio needs one for the limiter)
+        return Database(DatabaseSettings(url="http://supabase.test", key="test.service.key", http2=False))
+
+    database = asyncio.run(create())
+    session = database.postgrest.session
+    database._session = httpx.Client(
+        base_url=session.base_url,
+        headers=session.headers,
+        transport=httpx.MockTransport(postgrest.handler),
+    )
+    session.close()
+    database.postgrest.session = database._session
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def client(db: Database) -> TestClient:
+    """The app without its lifespan (no background tasks), wired to the fake database"""
+    from main import app
+
+    app.state.db = db
+    return TestClient(app)
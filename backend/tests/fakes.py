@@ -0,0 +1,121 @@
+"""In-memory stand-ins used by the tests."""
+
+import json
+from typing import Any, Callable, Dict, List
+
+import httpx
+
+OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "lt": lambda a, b: a < b,
+    "gt": lambda a, b: a > b,
+}
+
+
+def _value(raw: str) -> str:
+    return raw[1:-1] if raw.startswith('"') and raw.endswith('"') else raw
+
+
+def _condition(expression: str):
+    """Parse one PostgREST condition (``col.op.value`` or ``and(...)``) into a row predicate"""
+    if expression.startswith("and(") and expression.endswith(")"):
+        parts = [_condition(part) for part in _split(expression[4:-1])]
+        return lambda row: all(part(row) for part in parts)
+    column, operator, value = expression.split(".", 2)
+    if operator == "in":
+        values = {_value(item) for item in _split(value[1:-1])}
+        return lambda row: str(row.get(column)) in values
+    compare = OPERATORS[operator]
+    value = _value(value)
+    return lambda row: row.get(column) is not None and compare(str(row[column]), value)
+
+
+def _split(expression: str) -> List[str]:
+    """Split on top-level commas"""
+    parts, depth, current = [], 0, ""
+    for char in expression:
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += char == "("
+        depth -= char == ")"
+        current += char
+    return parts + [current]
+
+
+class FakePostgREST:
+    """Serves table reads and inserts from ``tables`` and records every request
+
+    Supports what the list endpoints send: ``eq``/``lt``/``gt``/``in`` filters, ``or``
+    with nested ``and``, a multi-column ``order``, ``limit``, ``offset`` and a
+    ``Range`` header. Timestamps are compared as strings, so fixtures should
+    use one ISO format.
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        # Database functions: name -> callable taking the call's arguments,
+        # returning the response body or an httpx.Response
+        self.functions: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        # Table name -> callable taking the rows of an insert, returning an
+        # error httpx.Response to fail the whole statement, or None
+        self.insert_errors: Dict[str, Callable[[List[Dict[str, Any]]], Any]] = {}
+        self.requests: List[httpx.Request] = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        table = request.url.path.rsplit("/", 1)[-1]
+
+        if "/rpc/" in request.url.path:
+            result = self.functions[table](json.loads(request.content or b"{}"))
+            return result if isinstance(result, httpx.Response) else httpx.Response(200, json=result)
+        rows = self.tables.setdefault(table, [])
+
+        if request.method == "POST":
+            body = json.loads(request.content)
+            new_rows = body if isinstance(body, list) else [body]
+            error = self.insert_errors[table](new_rows) if table in self.insert_errors else None
+            if error is not None:
+                return error
+            rows.extend(new_rows)
+            return httpx.Response(201, json=new_rows)
+
+        result = list(rows)
+        params = request.url.params
+        for key, raw in params.multi_items():
+            if key == "or":
+                conditions = [_condition(part) for part in _split(raw[1:-1])]
+                result = [row for row in result if any(condition(row) for condition in conditions)]
+            elif key not in ("select", "order", "limit", "offset"):
+                condition = _condition(f"{key}.{raw}")
+                result = [row for row in result if condition(row)]
+
+        for term in reversed(params.get("order", "").split(",") if params.get("order") else []):
+            column, _, direction = term.partition(".")
+            result.sort(key=lambda row: row[column], reverse=direction == "desc")
+
+        start = int(params.get("offset", 0))
+        end = start + int(params["limit"]) if "limit" in params else None
+        if "Range" in request.headers:
+            first, last = request.headers["Range"].split("-")
+            start, end = int(first), int(last) + 1
+        result = result[start:end]
+
+        select = params.get("select", "*")
+        if select != "*" and "(" not in select:
+            columns = select.split(",")
+            result = [{column: row.get(column) for column in columns} for row in result]
+        return httpx.Response(200, json=result)
+
+    def last_params(self) -> httpx.QueryParams:
+        return self.requests[-1].url.params
+
+
+def timestamp(n: int) -> str:
+    """The n-th of a series of increasing timestamps"""
+    return f"2024-01-01T00:00:{n:02d}+00:00"
+
+
+def row_id(n: int) -> str:
+    return f"00000000-0000-0000-0000-{n:012d}"
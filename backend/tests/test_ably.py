@@ -0,0 +1,76 @@
+import asyncio
+import json
+import time
+
+from ably import AblyRest
+from jose import jwt
+
+import security
+from fakes import row_id, timestamp
+from messaging.ably_publisher import AblyPublisher, FakeAbly, room_channel
+from messaging.connections import Connection
+from messaging.pubsub import InProcessBroker
+from routes import chat
+from routes.chat import ConnectionManager
+
+ROOM = row_id(900)
+USER = row_id(1)
+
+
+def message(n):
+    return {"id": row_id(n), "room_id": ROOM, "sender_id": row_id(2), "content": f"message {n}", "created_at": timestamp(n)}
+
+
+def run_with_ably(socket_delivery):
+    async def main():
+        ably = FakeAbly()
+        manager = ConnectionManager()
+        await manager.start(InProcessBroker(), AblyPublisher(ably, socket_delivery=socket_delivery))
+        manager.rooms.set(ROOM, [USER, row_id(2)])
+        connection = Connection(None, USER)
+        manager.active_connections[USER] = {connection.id: connection}
+
+        async def empty_room(count):
+            return []
+
+        await manager.history.ensure_loaded(ROOM, empty_room)
+        await manager.broadcast_message(message(1), None)
+        await manager.stop()
+        return ably, manager, connection
+
+    return asyncio.run(main())
+
+
+def test_ably_mode_keeps_socket_delivery_during_migration():
+    ably, manager, connection = run_with_ably(socket_delivery=True)
+    assert [m.data["id"] for m in ably.published[room_channel(ROOM)]] == [row_id(1)]
+    assert json.loads(connection.queue.get_nowait())["id"] == row_id(1)
+
+
+def test_socket_delivery_can_be_turned_off():
+    ably, manager, connection = run_with_ably(socket_delivery=False)
+    assert [m.data["id"] for m in ably.published[room_channel(ROOM)]] == [row_id(1)]
+    assert connection.queue.empty()
+    # Every worker still keeps it in the room's recent history
+    assert [row["id"] for row in manager.history.latest(ROOM, 10)] == [row_id(1)]
+
+
+def test_token_request_is_scoped_to_the_callers_channels(client, postgrest, monkeypatch):
+    secret = "test-jwt-secret"
+    monkeypatch.setattr(security, "SUPABASE_JWT_SECRET", secret)
+    monkeypatch.setattr(chat.manager, "publisher", AblyPublisher(AblyRest("app.key:secret")))
+    postgrest.tables["chat_participants"] = [{"room_id": ROOM, "user_id": USER}, {"room_id": row_id(901), "user_id": row_id(2)}]
+    token = jwt.encode({"sub": USER, "aud": "authenticated", "exp": int(time.time()) + 600}, secret, algorithm="HS256")
+
+    response = client.get("/api/chat/ably-token", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    token_request = response.json()
+    assert token_request["clientId"] == USER
+    assert json.loads(token_request["capability"]) == {f"chat:room:{ROOM}": ["subscribe"], f"chat:user:{USER}": ["subscribe"]}
+    assert token_request["mac"]
+
+
+def test_token_endpoint_is_off_without_ably(client, monkeypatch):
+    monkeypatch.setattr(security, "SUPABASE_JWT_SECRET", "s")
+    token = jwt.encode({"sub": USER, "aud": "authenticated", "exp": int(time.time()) + 600}, "s", algorithm="HS256")
+    assert client.get("/api/chat/ably-token", headers={"Authorization": f"Bearer {token}"}).status_code == 404
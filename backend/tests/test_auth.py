@@ -0,0 +1,34 @@
+import time
+from types import SimpleNamespace
+
+from jose import jwt
+
+import security
+from fakes import row_id
+
+SECRET = "test-jwt-secret"
+USER = row_id(1)
+
+
+def token_for(user_id):
+    claims = {"sub": user_id, "aud": "authenticated", "email": "user@example.com", "exp": int(time.time()) + 600}
+    return jwt.encode(claims, SECRET, algorithm="HS256")
+
+
+def test_logout_revokes_the_callers_token(client, db, postgrest, monkeypatch):
+    monkeypatch.setattr(security, "SUPABASE_JWT_SECRET", SECRET)
+    postgrest.tables["users"] = [{"id": USER, "email": "user@example.com", "name": "User", "role": "customer"}]
+    token = token_for(USER)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    signed_out = []
+    monkeypatch.setattr(db.auth, "get_user", lambda jwt: SimpleNamespace(user=SimpleNamespace(id=USER)))
+    monkeypatch.setattr(db.auth.admin, "sign_out", signed_out.append)
+
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+    assert client.post("/api/auth/logout", headers=headers).status_code == 200
+    assert signed_out == [token]
+
+    # Locally verified routes refuse it too, not only the ones that ask the auth server
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+    assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {token_for(row_id(2))}"}).status_code == 200
@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from fakes import row_id, timestamp
+from messaging.connections import Connection
+from messaging.pubsub import InProcessBroker
+from routes.chat import ConnectionManager
+
+ROOM = row_id(900)
+ALICE = row_id(1)
+BOB = row_id(2)
+
+
+def connect(manager, user_id):
+    # Queue only: the writer task is not started, so sent items stay in the queue
+    connection = Connection(None, user_id)
+    manager.active_connections.setdefault(user_id, {})[connection.id] = connection
+    return connection
+
+
+def received(connection):
+    return [json.loads(connection.queue.get_nowait()) for _ in range(connection.queue.qsize())]
+
+
+def message(n, sender):
+    return {"id": row_id(n), "room_id": ROOM, "sender_id": sender, "content": f"message {n}", "created_at": timestamp(n)}
+
+
+def test_message_reaches_every_device_but_the_sending_one():
+    async def main():
+        manager = ConnectionManager()
+        await manager.start(InProcessBroker())
+        manager.rooms.set(ROOM, [ALICE, BOB])
+        phone, web = connect(manager, ALICE), connect(manager, ALICE)
+        bob = connect(manager, BOB)
+
+        await manager.broadcast_message(message(1, ALICE), None, origin=phone)
+        assert received(phone) == []
+        assert [row["id"] for row in received(web)] == [row_id(1)]
+        assert [row["id"] for row in received(bob)] == [row_id(1)]
+
+        # Sent through the REST API: no originating socket, every device gets it
+        await manager.broadcast_message(message(2, ALICE), None)
+        assert [row["id"] for row in received(phone)] == [row_id(2)]
+        assert [row["id"] for row in received(web)] == [row_id(2)]
+
+    asyncio.run(main())
+
+
+def test_connection_ids_are_distinct():
+    assert len({Connection(None, ALICE).id for _ in range(100)}) == 100
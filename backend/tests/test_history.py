@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+from fakes import row_id, timestamp
+from messaging.connections import Connection
+from messaging.history import RecentMessages, parse_timestamp
+from routes import chat
+
+ROOM = row_id(900)
+
+
+def message(n):
+    return {
+        "id": row_id(n), "room_id": ROOM, "sender_id": row_id(901), "message_type": "text", "content": f"message {n}",
+        "attachments": [], "is_read": False, "created_at": timestamp(n), "updated_at": timestamp(n)
+    }
+
+
+def test_buffer_from_long_room_is_not_complete(client, postgrest, monkeypatch):
+    monkeypatch.setattr(chat.manager, "history", RecentMessages(size=5))
+    postgrest.tables["messages"] = [message(n) for n in range(20)]
+
+    response = client.get(f"/api/chat/rooms/{ROOM}/messages", params={"limit": 2})
+    assert [row["id"] for row in response.json()] == [row_id(19), row_id(18)]
+    assert postgrest.last_params()["limit"] == "6"
+
+    # The buffer holds messages 15-19; a reconnect from before that must go to the database
+    assert chat.manager.history.since(ROOM, parse_timestamp(timestamp(3))) is None
+    assert [row["id"] for row in chat.manager.history.since(ROOM, parse_timestamp(timestamp(17)))] == [row_id(18), row_id(19)]
+
+
+def test_buffer_from_short_room_is_complete():
+    history = RecentMessages(size=5)
+
+    async def fetch(count):
+        return [message(n) for n in reversed(range(3))][:count]
+
+    asyncio.run(history.ensure_loaded(ROOM, fetch))
+    assert len(history.since(ROOM, parse_timestamp("2000-01-01T00:00:00+00:00"))) == 3
+
+
+def test_concurrent_loads_share_one_fetch():
+    history = RecentMessages(size=5)
+    calls = []
+
+    async def fetch(count):
+        calls.append(count)
+        await asyncio.sleep(0.01)
+        # Broadcast while the load is in flight; must survive the load
+        history.append(ROOM, message(10))
+        return [message(n) for n in reversed(range(3))]
+
+    async def main():
+        await asyncio.gather(*(history.ensure_loaded(ROOM, fetch) for _ in range(5)))
+
+    asyncio.run(main())
+    assert calls == [6]
+    assert [row["id"] for row in history.latest(ROOM, 10)] == [row_id(10), row_id(2), row_id(1), row_id(0)]
+
+
+def test_reconnect_catch_up_uses_the_buffer_and_falls_back_to_the_database(client, db, postgrest, monkeypatch):
+    monkeypatch.setattr(chat.manager, "history", RecentMessages(size=5))
+    other_room = row_id(902)
+    user = row_id(903)
+    older = {**message(50), "room_id": other_room}
+    postgrest.tables["messages"] = [message(n) for n in range(20)] + [older]
+    postgrest.tables["chat_participants"] = [{"room_id": ROOM, "user_id": user}, {"room_id": other_room, "user_id": user}]
+
+    # Buffers ROOM (messages 15-19); other_room stays unbuffered
+    client.get(f"/api/chat/rooms/{ROOM}/messages", params={"limit": 2})
+    reads = len(postgrest.requests)
+
+    connection = Connection(None, user)
+    asyncio.run(chat.send_missed_messages(connection, parse_timestamp(timestamp(16)), db))
+    replayed = [json.loads(connection.queue.get_nowait())["id"] for _ in range(connection.queue.qsize())]
+
+    # 17-19 from the buffer, the other room's message from the database
+    assert replayed == [row_id(17), row_id(18), row_id(19), row_id(50)]
+    database_reads = postgrest.requests[reads:]
+    assert [request.url.params.get("room_id") for request in database_reads if "messages" in request.url.path] == [f"in.({other_room})"]
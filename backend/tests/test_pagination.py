@@ -0,0 +1,66 @@
+import pytest
+from fastapi import HTTPException
+
+from fakes import row_id, timestamp
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+
+
+def add_users(postgrest, count):
+    postgrest.tables["users"] = [
+        {"id": row_id(n), "email": f"user{n}@example.com", "name": f"User {n}", "role": "customer", "created_at": timestamp(n), "updated_at": timestamp(n)}
+        for n in range(count)
+    ]
+
+
+def test_cursor_round_trip(client, postgrest):
+    add_users(postgrest, 5)
+
+    seen = []
+    response = client.get("/api/users/", params={"limit": 2})
+    while True:
+        assert response.status_code == 200
+        seen.extend(user["id"] for user in response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+        response = client.get("/api/users/", params={"limit": 2, "cursor": cursor})
+
+    assert seen == [row_id(n) for n in reversed(range(5))]
+
+
+def test_pages_request_a_look_ahead_row(client, postgrest):
+    add_users(postgrest, 5)
+
+    response = client.get("/api/users/", params={"limit": 5})
+    assert len(response.json()) == 5
+    assert NEXT_CURSOR_HEADER not in response.headers
+    assert postgrest.last_params()["limit"] == "6"
+    assert "Range" not in postgrest.requests[-1].headers
+
+    response = client.get("/api/users/", params={"limit": 2, "offset": 2})
+    assert [user["id"] for user in response.json()] == [row_id(2), row_id(1)]
+    assert NEXT_CURSOR_HEADER in response.headers
+    assert postgrest.last_params()["offset"] == "2"
+
+
+@pytest.mark.parametrize("limit", [0, -1, 10000])
+def test_limit_is_bounded(client, limit):
+    assert client.get("/api/users/", params={"limit": limit}).status_code == 422
+
+
+def test_decode_cursor_checks_values():
+    cursor = encode_cursor({"created_at": timestamp(1), "id": row_id(1)})
+    assert decode_cursor(cursor) == (timestamp(1), row_id(1))
+
+    rank_cursor = encode_cursor({"rank": 0.25, "id": row_id(1)}, column="rank")
+    assert decode_cursor(rank_cursor, column="rank") == ("0.25", row_id(1))
+
+    for bad in (
+        "not-a-cursor",
+        encode_cursor({"created_at": "yesterday", "id": row_id(1)}),
+        encode_cursor({"created_at": timestamp(1), "id": "1),id.gt.0"}),
+        encode_cursor({"rank": "nan", "id": row_id(1)}, column="rank"),
+    ):
+        with pytest.raises(HTTPException) as error:
+            decode_cursor(bad, column="rank" if "rank" in str(bad) else "created_at")
+        assert error.value.status_code == 400
@@ -0,0 +1,37 @@
+import pytest
+
+import responses
+from fakes import row_id, timestamp
+from pagination import NEXT_CURSOR_HEADER
+from test_pagination import add_users
+
+
+@pytest.mark.parametrize("strict", [False, True])
+def test_projected_pages_return_only_requested_fields(client, postgrest, monkeypatch, strict):
+    monkeypatch.setattr(responses, "STRICT_RESPONSE_VALIDATION", strict)
+    add_users(postgrest, 5)
+
+    pages = []
+    response = client.get("/api/users/", params={"limit": 2, "fields": "name"})
+    while True:
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+        response = client.get("/api/users/", params={"limit": 2, "fields": "name", "cursor": cursor})
+
+    # The keyset columns are still selected for the cursor, but not returned
+    assert postgrest.last_params()["select"] == "name,created_at,id"
+    assert pages == [[{"name": "User 4"}, {"name": "User 3"}], [{"name": "User 2"}, {"name": "User 1"}], [{"name": "User 0"}]]
+
+
+def test_requested_keyset_columns_are_kept(client, postgrest):
+    add_users(postgrest, 2)
+
+    response = client.get("/api/users/", params={"fields": "id,email"})
+    assert response.json() == [{"id": row_id(1), "email": "user1@example.com"}, {"id": row_id(0), "email": "user0@example.com"}]
+
+
+def test_unknown_fields_are_rejected(client):
+    assert client.get("/api/users/", params={"fields": "name,password"}).status_code == 400
@@ -0,0 +1,48 @@
+import json
+
+import msgpack
+
+from fakes import row_id, timestamp
+from messaging.protocol import JSON, CompactJSONProtocol, MsgpackProtocol, negotiate
+
+ROW = {
+    "id": row_id(1), "room_id": row_id(900), "sender_id": row_id(2), "message_type": "text", "content": "hi",
+    "attachments": [], "is_read": False, "created_at": timestamp(1), "updated_at": timestamp(1)
+}
+COMPACT = {"e": "m", "i": row_id(1), "r": row_id(900), "s": row_id(2), "t": "text", "c": "hi", "ts": timestamp(1)}
+
+
+def test_msgpack_frames_unpack_as_a_list_of_envelopes():
+    protocol = MsgpackProtocol()
+    # Fixarray header below 16 items, array16 from 16 on
+    for count in (1, 15, 16, 40):
+        items = [protocol.encode_message({**ROW, "content": str(n)}) for n in range(count)]
+        batch = msgpack.unpackb(protocol.frame(items))
+        assert batch == [{**COMPACT, "c": str(n)} for n in range(count)]
+
+
+def test_events_use_short_names():
+    event = {"type": "read_receipt", "room_id": row_id(900), "user_id": row_id(2), "message_id": row_id(1), "read_up_to": timestamp(1)}
+    expected = {"e": "rr", "r": row_id(900), "u": row_id(2), "i": row_id(1), "ts": timestamp(1)}
+    assert msgpack.unpackb(MsgpackProtocol().encode_event(event)) == expected
+    assert json.loads(CompactJSONProtocol().encode_event(event)) == expected
+
+
+def test_compact_json_frames_are_one_array():
+    protocol = CompactJSONProtocol()
+    items = [protocol.encode_message(ROW), protocol.encode_message({**ROW, "attachments": ["a.png"]})]
+    assert json.loads(protocol.frame(items)) == [COMPACT, {**COMPACT, "a": ["a.png"]}]
+
+
+def test_decode_maps_short_names():
+    incoming = {"r": row_id(900), "c": "hi", "t": "text", "a": []}
+    expected = {"room_id": row_id(900), "content": "hi", "message_type": "text", "attachments": []}
+    assert MsgpackProtocol().decode(msgpack.packb(incoming)) == expected
+    assert CompactJSONProtocol().decode(json.dumps(incoming)) == expected
+
+
+def test_negotiate_picks_the_first_supported_subprotocol():
+    assert negotiate(["other", "zavolah.msgpack.v1", "zavolah.compact.v1"]).name == "msgpack"
+    assert negotiate(["zavolah.compact.v1"]).name == "compact"
+    assert negotiate(["other"]) is JSON
+    assert negotiate([]) is JSON
@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+from fakes import row_id, timestamp
+from messaging.connections import Connection
+from messaging.pubsub import LocalBroker, LocalBus
+from routes.chat import ConnectionManager
+
+ROOM = row_id(900)
+ALICE = row_id(1)
+BOB = row_id(2)
+CAROL = row_id(3)
+
+
+def worker(bus):
+    manager = ConnectionManager()
+    manager.rooms.set(ROOM, [ALICE, BOB])
+    return manager, LocalBroker(bus)
+
+
+def connect(manager, user_id):
+    connection = Connection(None, user_id)
+    manager.active_connections.setdefault(user_id, {})[connection.id] = connection
+    return connection
+
+
+def received(connection):
+    return [json.loads(connection.queue.get_nowait()) for _ in range(connection.queue.qsize())]
+
+
+def test_message_sent_on_one_worker_reaches_sockets_on_the_others():
+    async def main():
+        bus = LocalBus()
+        (first, first_broker), (second, second_broker) = worker(bus), worker(bus)
+        await first.start(first_broker)
+        await second.start(second_broker)
+
+        alice = connect(first, ALICE)
+        bob = connect(second, BOB)
+        carol = connect(second, CAROL)
+
+        row = {"id": row_id(10), "room_id": ROOM, "sender_id": ALICE, "content": "hi", "created_at": timestamp(10)}
+        await first.broadcast_message(row, None, origin=alice)
+
+        assert received(alice) == []
+        assert received(bob) == [row]
+        # Not a member of the room
+        assert received(carol) == []
+
+        # Read receipts travel the same way
+        await second.send_to_room({"type": "read_receipt", "room_id": ROOM, "user_id": BOB, "read_up_to": timestamp(10)}, ROOM, None)
+        assert [event["type"] for event in received(alice)] == ["read_receipt"]
+
+        await first.stop()
+        await second.stop()
+        assert bus.brokers == []
+
+    asyncio.run(main())
+
+
+def test_local_broker_does_not_share_objects_with_the_publisher():
+    async def main():
+        bus = LocalBus()
+        seen = []
+        publisher, subscriber = LocalBroker(bus), LocalBroker(bus)
+        await publisher.start(lambda event: None)
+        await subscriber.start(seen.append)
+
+        event = {"recipients": [BOB], "exclude": None, "event": {"type": "ping"}}
+        await publisher.publish(event)
+        event["event"]["type"] = "changed"
+        assert seen == [{"recipients": [BOB], "exclude": None, "event": {"type": "ping"}}]
+
+    asyncio.run(main())
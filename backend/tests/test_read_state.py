@@ -0,0 +1,37 @@
+import httpx
+
+from fakes import row_id, timestamp
+
+ROOM = row_id(900)
+READER = row_id(1)
+
+
+def test_mark_room_read_validates_before_calling_the_database(client, postgrest):
+    assert client.put(f"/api/chat/rooms/{ROOM}/read", params={"user_id": READER, "up_to": "soon"}).status_code == 400
+    assert client.put(f"/api/chat/rooms/{ROOM}/read", params={"user_id": "me"}).status_code == 400
+    assert postgrest.requests == []
+
+
+def test_mark_room_read_reports_unknown_message_as_404(client, postgrest):
+    postgrest.functions["mark_room_read"] = lambda args: httpx.Response(404, json={
+        "code": "P0002", "message": f"Message {args['p_message_id']} not found in room {args['p_room_id']}", "details": None, "hint": None
+    })
+
+    response = client.put(f"/api/chat/rooms/{ROOM}/read", params={"user_id": READER, "message_id": row_id(5)})
+    assert response.status_code == 404
+
+
+def test_mark_room_read_sends_the_readers_watermark(client, postgrest):
+    calls = []
+
+    def mark_room_read(args):
+        calls.append(args)
+        return [{"marked_count": 3, "read_up_to": timestamp(9)}]
+
+    postgrest.functions["mark_room_read"] = mark_room_read
+    postgrest.tables["chat_participants"] = [{"room_id": ROOM, "user_id": READER}]
+
+    response = client.put(f"/api/chat/rooms/{ROOM}/read", params={"user_id": READER, "up_to": "2024-01-01T00:00:09Z"})
+    assert response.status_code == 200
+    assert response.json()["marked_count"] == 3
+    assert calls == [{"p_room_id": ROOM, "p_user_id": READER, "p_message_id": None, "p_up_to": timestamp(9)}]
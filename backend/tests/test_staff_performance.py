@@ -0,0 +1,28 @@
+import asyncio
+
+from fakes import row_id
+from staff_performance import StaffPerformance
+
+
+def member(n, department, completed, total):
+    return {
+        "staff_id": row_id(n), "user_id": row_id(100 + n), "department": department, "position": "agent",
+        "total_tasks": total, "completed_tasks": completed, "pending_tasks": total - completed,
+        "in_progress_tasks": 0, "overdue_tasks": 0, "avg_completion_hours": 2.0 if completed else None
+    }
+
+
+def test_summary_handles_members_without_a_department(db, postgrest):
+    postgrest.functions["staff_performance"] = lambda args: [
+        member(1, "support", 1, 2),
+        member(2, None, 3, 3),
+        member(3, "support", 2, 2),
+    ]
+
+    summary = asyncio.run(StaffPerformance().summary(db))
+
+    assert [department["department"] for department in summary["departments"]] == [None, "support"]
+    support = summary["departments"][1]
+    assert support["staff_count"] == 2
+    assert support["completion_rate"] == 75
+    assert [row["staff_id"] for row in summary["members"]] == [row_id(2), row_id(3), row_id(1)]
@@ -0,0 +1,58 @@
+import asyncio
+
+import httpx
+
+from fakes import row_id
+from messaging.writer import MessageWriter
+
+ROOM = row_id(900)
+MISSING_ROOM = row_id(999)
+
+
+def queue(writer, count, room_id=ROOM):
+    return [writer.write({"room_id": room_id, "sender_id": row_id(1), "content": f"message {n}"}) for n in range(count)]
+
+
+def reject_missing_room(rows):
+    if any(row["room_id"] == MISSING_ROOM for row in rows):
+        return httpx.Response(409, json={"code": "23503", "message": "violates foreign key constraint", "details": None, "hint": None})
+
+
+def test_rejected_row_is_dropped_without_blocking_the_batch(db, postgrest):
+    postgrest.insert_errors["messages"] = reject_missing_room
+    writer = MessageWriter(enabled=True)
+    good = queue(writer, 5)
+    bad = queue(writer, 1, room_id=MISSING_ROOM)
+    good += queue(writer, 4)
+
+    asyncio.run(writer.flush(db))
+
+    assert [row["id"] for row in postgrest.tables["messages"]] == [row["id"] for row in good]
+    assert bad[0]["id"] not in {row["id"] for row in postgrest.tables["messages"]}
+    assert writer._pending == []
+
+
+def test_transient_failure_is_retried_in_order(db, postgrest):
+    outage = [True]
+    postgrest.insert_errors["messages"] = lambda rows: httpx.Response(503, json={"code": "PGRST000", "message": "database unavailable", "details": None, "hint": None}) if outage[0] else None
+    writer = MessageWriter(enabled=True)
+    first = queue(writer, 3)
+
+    asyncio.run(writer.flush(db))
+    assert len(postgrest.requests) == 1
+    assert "messages" not in postgrest.tables or postgrest.tables["messages"] == []
+
+    second = queue(writer, 2)
+    outage[0] = False
+    asyncio.run(writer.flush(db))
+    assert [row["id"] for row in postgrest.tables["messages"]] == [row["id"] for row in first + second]
+
+
+def test_queue_is_capped_while_the_database_is_down(db, postgrest):
+    postgrest.insert_errors["messages"] = lambda rows: httpx.Response(503, json={"code": "PGRST000", "message": "database unavailable", "details": None, "hint": None})
+    writer = MessageWriter(enabled=True, max_pending=5)
+    rows = queue(writer, 8)
+
+    assert [row["id"] for row in writer._pending] == [row["id"] for row in rows[3:]]
+    asyncio.run(writer.flush(db))
+    assert len(writer._pending) == 5